@@ -1,29 +1,20 @@
 import streamlit as st
 import pandas as pd
-from fpdf import FPDF
-import tempfile
 from datetime import timedelta, date, datetime
 import plotly.express as px
 import os
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from PIL import Image
 import sync_notion
+import armazenamento
+from indice_dados import IndiceAreas
+import relatorio_pdf
+import fila_relatorios
+from relatorio_pdf import limpar_texto_pdf, salvar_imagem_temporaria
 import importlib
-from openai import OpenAI
+import resumo_ia
 
 # --- CONFIGURAÇÃO PADRÃO ---
-LOGO_PADRAO = "logo.jpg"
 icone_padrao = "Icon.ico"
 page_icon = icone_padrao if os.path.exists(icone_padrao) else "📊"
-DB_FILE = "tarefas_dbv.csv"
-
-# CORES DBV (RGB)
-COR_VERDE_DBV = (32, 53, 47)
-COR_DOURADO = (148, 129, 97)
-COR_CINZA_CLARO = (245, 245, 245)
-COR_VERMELHO_SUAVE = (180, 60, 60)
-COR_AZUL_S2 = (52, 73, 94)
 
 # --- CHAVE API OPENAI ---
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -33,260 +24,58 @@ st.set_page_config(
 )
 
 
-# --- FUNÇÃO IA PREDITIVA (PARSING ROBUSTO) ---
-def gerar_resumo_ia(texto_comentarios, api_key, data_atual_str, data_s2_str):
-    if not texto_comentarios or len(texto_comentarios) < 10:
-        return "Sem dados.", "", "", ""
-    try:
-        client = OpenAI(api_key=api_key)
-
-        prompt = f"""
-        Atue como um PMO Sênior da DBV. Analise o status, datas e comentários.
-        
-        CONTEXTO:
-        - Hoje (Semana Atual): {data_atual_str}
-        - Semana Futura (S+2 - Daqui a 15 dias): {data_s2_str}
-
-        Gere 4 seções OBRIGATÓRIAS usando EXATAMENTE estas tags:
-        
-        [ENTREGAS]: O que foi concluído/avançado NESTA semana.
-        [TRAVAS]: O que está impedindo o avanço hoje.
-        [ACAO]: O que será feito na semana que vem (S+1).
-        [S2]: O que está planejado para a semana S+2 ({data_s2_str}). Se não houver info explícita, PROJETE o próximo passo lógico.
-
-        REGRAS VISUAIS:
-        - Use APENAS hífens (-) para os itens.
-        - Sem negrito.
-        - Texto limpo e direto.
-        
-        DADOS:
-        {texto_comentarios}
-        """
-
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "Você é um assistente de PMO."},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.3,
-        )
-
-        r = response.choices[0].message.content
-
-        # Lógica de Extração Robusta (Parsing)
-        # Inicializa variáveis
-        ent = "Não identificado."
-        trv = "Não identificado."
-        aca = "Não identificado."
-        s2 = "Não identificado."
-
-        # Tenta quebrar o texto pelas tags
-        try:
-            if "[ENTREGAS]:" in r:
-                ent = r.split("[ENTREGAS]:")[1].split("[TRAVAS]:")[0].strip()
-
-            if "[TRAVAS]:" in r:
-                temp = r.split("[TRAVAS]:")[1]
-                trv = temp.split("[ACAO]:")[0].strip()
-
-            if "[ACAO]:" in r:
-                temp = r.split("[ACAO]:")[1]
-                # Pega até o S2, se existir
-                if "[S2]:" in temp:
-                    aca = temp.split("[S2]:")[0].strip()
-                else:
-                    aca = temp.strip()
-
-            if "[S2]:" in r:
-                s2 = r.split("[S2]:")[1].strip()
-
-        except Exception as parse_error:
-            # Fallback simples caso a IA bagunce a formatação
-            s2 = f"Erro no formato da IA: {parse_error}. Texto bruto: {r[-100:]}"
-
-        return ent, trv, aca, s2
-
-    except Exception as e:
-        return f"Erro OpenAI: {str(e)}", "", "", ""
+# --- UTILIDADES ---
+def carregar_dados(areas=None, projetos=None):
+    return armazenamento.carregar_tarefas(areas=areas, projetos=projetos)
 
 
-# --- UTILIDADES ---
-def limpar_texto_pdf(texto):
-    if not isinstance(texto, str):
-        return str(texto)
-    texto = texto.replace("*", "")
-    mapa = {"–": "-", "—": "-", "“": '"', "”": '"', "‘": "'", "’": "'"}
-    for k, v in mapa.items():
-        texto = texto.replace(k, v)
-    return texto.encode("latin-1", "replace").decode("latin-1")
-
-
-def salvar_imagem_temporaria(f):
-    if not f:
-        return None
-    try:
-        img = Image.open(f)
-        if img.mode in ("RGBA", "P"):
-            img = img.convert("RGB")
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp:
-            img.save(tmp.name, format="JPEG", quality=90)
-            return tmp.name
-    except:
-        return None
-
-
-def carregar_dados():
-    cols = [
-        "page_id",
-        "Area",
-        "Projeto",
-        "Tarefa",
-        "Responsavel",
-        "Inicio",
-        "Fim",
-        "Status",
-        "Observacao",
-    ]
-    if not os.path.exists(DB_FILE):
-        return pd.DataFrame(columns=cols)
-    df = pd.read_csv(DB_FILE)
-    for c in cols:
-        if c not in df.columns:
-            df[c] = ""
-    if not df.empty:
-        df["Inicio"] = pd.to_datetime(df["Inicio"], errors="coerce").dt.date
-        df["Fim"] = pd.to_datetime(df["Fim"], errors="coerce").dt.date
-        df["Observacao"] = df["Observacao"].fillna("")
-        df["Responsavel"] = df["Responsavel"].fillna("-")
-    return df
-
-
-def gerar_imagem_gantt(area, projs=None):
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _dataset_compartilhado(versao):
+    # Um único DataFrame por processo do servidor, compartilhado entre as sessões.
+    # Só recarrega quando a versão dos dados muda (ou seja, após um sync gravar).
     df = carregar_dados()
-    if df.empty:
-        return None
-    df["Area_Upper"] = df["Area"].astype(str).str.upper()
-    df_area = df[df["Area_Upper"] == str(area).upper()].copy()
-    if projs:
-        df_area = df_area[df_area["Projeto"].isin(projs)]
-    if df_area.empty:
-        return None
-
-    df_area = df_area.sort_values(by="Inicio")
-    h = max(6, len(df_area) * 0.5)
-
-    plt.style.use("default")
-    fig, ax = plt.subplots(figsize=(12, h))
-    cores = {
-        "Não Iniciado": "gray",
-        "Em Andamento": "#4da6ff",
-        "Bloqueado": "#ff4d4d",
-        "Concluído": "#00cc66",
+    return {
+        "df": df,
+        "indice": IndiceAreas(df),
+        "versao": versao,
+        "carregado_em": datetime.now(),
     }
-    y_lbl, y_pos = [], []
-    for i, (idx, r) in enumerate(df_area.iterrows()):
-        s, e = mdates.date2num(r["Inicio"]), mdates.date2num(r["Fim"])
-        if e - s == 0:
-            e += 1
-        ax.barh(
-            i,
-            e - s,
-            left=s,
-            height=0.6,
-            color=cores.get(r["Status"], "#4da6ff"),
-            alpha=0.8,
-        )
-        pl = limpar_texto_pdf(str(r["Projeto"]))[:15]
-        tl = limpar_texto_pdf(str(r["Tarefa"]))[:20]
-        y_lbl.append(f"{pl}.. - {tl}")
-        y_pos.append(i)
-        ax.text(
-            s + (e - s) / 2,
-            i,
-            limpar_texto_pdf(str(r["Responsavel"])),
-            ha="center",
-            va="center",
-            color="white",
-            fontsize=7,
-            fontweight="bold",
-        )
-    ax.set_yticks(y_pos)
-    ax.set_yticklabels(y_lbl, fontsize=9)
-    ax.xaxis_date()
-    ax.xaxis.set_major_formatter(mdates.DateFormatter("%d/%m"))
-    plt.title(
-        f"CRONOGRAMA: {limpar_texto_pdf(area).upper()}",
-        fontsize=14,
-        fontweight="bold",
-        color="#20352f",
-    )
-    plt.grid(axis="x", linestyle="--", alpha=0.5)
-    plt.tight_layout()
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
-    plt.savefig(tmp.name, dpi=100)
-    plt.close()
-    return tmp.name
-
-
-# --- PDF ESTILIZADO ---
-class PDF(FPDF):
-    def header(self):
-        if os.path.exists(LOGO_PADRAO):
-            try:
-                self.image(LOGO_PADRAO, 10, 8, 33)
-            except:
-                pass
-        self.set_font("Arial", "B", 15)
-        self.set_text_color(*COR_VERDE_DBV)
-        self.cell(0, 10, "RELATORIO DE STATUS", 0, 1, "R")
-        self.set_draw_color(*COR_DOURADO)
-        self.set_line_width(0.5)
-        self.line(10, 25, 200, 25)
-        self.ln(15)
-
-    def footer(self):
-        self.set_y(-15)
-        self.set_font("Arial", "I", 8)
-        self.set_text_color(*COR_DOURADO)
-        self.cell(0, 10, f"DBV Capital - Pagina {self.page_no()}", 0, 0, "C")
-
-    def chapter_block(self, title, content, color_header):
-        if not content or len(content) < 3:
-            return
-        self.set_fill_color(*color_header)
-        self.set_text_color(255, 255, 255)
-        self.set_font("Arial", "B", 10)
-        self.cell(0, 7, f"  {title}", 0, 1, "L", True)
-        self.set_fill_color(250, 250, 250)
-        self.set_text_color(0, 0, 0)
-        self.set_font("Arial", "", 10)
-        self.set_draw_color(*color_header)
-        self.set_line_width(0.5)
-
-        lines = content.split("\n")
-        for line in lines:
-            line = line.strip()
-            if not line or line == "**" or line == "*":
-                continue
-            if line.startswith("-") or line.startswith("*"):
-                clean_line = line[1:].strip()
-                texto_formatado = f"  {chr(149)}  {clean_line}"
-            else:
-                texto_formatado = f"  {line}"
-            self.multi_cell(
-                0, 6, limpar_texto_pdf(texto_formatado), border="L", fill=True
-            )
-        self.ln(3)
+
+
+def obter_dataset():
+    return _dataset_compartilhado(armazenamento.obter_armazenamento().versao())
 
 
 # --- INTERFACE ---
-df_geral = carregar_dados()
+dataset = obter_dataset()
+df_geral = dataset["df"]
+indice = dataset["indice"]
 st.title("📊 Relatório Oficial DBV")
 
 with st.sidebar:
     st.header("🤖 Configuração")
     api_key = st.text_input("OpenAI API Key", value="", type="password")
+    forcar_ia = st.checkbox("🔁 Forçar novo resumo (ignorar cache)")
+    reconstruir_ia = st.checkbox(
+        "🧹 Reconstruir resumos do zero",
+        help="Ignora o último resumo guardado e reenvia todo o histórico do projeto.",
+    )
+    orcamento_ia = st.number_input(
+        "Limite de tokens por projeto",
+        min_value=500,
+        max_value=30000,
+        value=resumo_ia.IA_ORCAMENTO_TOKENS,
+        step=500,
+    )
+    est_ia = resumo_ia.estatisticas_cache()
+    st.caption(
+        f"🧠 Cache IA: {est_ia['hits']} hits · "
+        f"{est_ia['tokens_economizados']} tokens economizados"
+    )
+    st.caption(
+        f"📦 Dados v{dataset['versao']} · carregados às "
+        f"{dataset['carregado_em'].strftime('%H:%M:%S')}"
+    )
 
 tab1, tab2, tab3, tab4 = st.tabs(
     [
@@ -327,19 +116,80 @@ with tab1:
     dep = cr2.text_input("🔗 Dependências")
 
     st.markdown("### 2. Projetos")
-    projs = []
-    if not df_geral.empty:
-        mask = df_geral["Area"].astype(str).str.upper() == str(area_sel).upper()
-        projs = df_geral[mask]["Projeto"].unique().tolist()
+    projs = indice.projetos(area_sel)
 
     sel_projs = st.multiselect("Selecione:", projs) if projs else []
     st.session_state.sel_projs_global = sel_projs
     infos = {}
 
+    def aplicar_resumo(p, secoes):
+        e, t, a, s2_predito = secoes
+        # Atualiza Fonte da Verdade
+        st.session_state[f"ent_{p}"] = e
+        st.session_state[f"trv_{p}"] = t
+        st.session_state[f"aca_{p}"] = a
+        st.session_state[f"plan_s2_{p}"] = s2_predito
+
+        # LIMPEZA DE CACHE DO WIDGET (O Segredo!)
+        # Remove as chaves dos widgets para obrigar o Streamlit a ler o novo valor do session_state
+        if f"widget_s2_tab1_{p}" in st.session_state:
+            del st.session_state[f"widget_s2_tab1_{p}"]
+        if f"widget_s2_tab4_{p}" in st.session_state:
+            del st.session_state[f"widget_s2_tab4_{p}"]
+
+    # Texto incremental para a IA; a legenda conta o prompt inteiro (instruções + dados)
+    def texto_para_ia(p, ts):
+        txt, _, coberto = resumo_ia.montar_texto_incremental(
+            area_sel, p, ts, dt, dt_s2_fim, orcamento_ia, reconstruir=reconstruir_ia
+        )
+        st.session_state[f"tok_{p}"] = resumo_ia.contar_tokens(
+            resumo_ia.montar_prompt(txt, st.session_state.sem, str_s2)
+        )
+        return txt, coberto
+
+    # Nada mudou desde o último resumo do projeto: reaproveita sem chamar a IA
+    def resumo_guardado(p, ts):
+        if forcar_ia or reconstruir_ia:
+            return None
+        return resumo_ia.resumo_sem_mudancas(area_sel, p, ts, dt, dt_s2_fim, orcamento_ia)
+
+    def aplicar_resumo_ia(p, secoes, coberto):
+        resumo_ia.registrar_resumo(area_sel, p, secoes, coberto)
+        aplicar_resumo(p, secoes)
+
     if sel_projs:
         st.markdown("---")
         up_geral = st.file_uploader("📸 Visão Geral", type=["png", "jpg"])
 
+        # --- RASCUNHO LOCAL (sem IA): status, prazos e datas do chat ---
+        if st.button("⚡ Rascunho de Todos (sem IA)"):
+            for p in sel_projs:
+                aplicar_resumo(
+                    p,
+                    resumo_ia.resumo_extrativo(
+                        indice.linhas_projeto(area_sel, p), dt, dt_s2_fim
+                    ),
+                )
+            st.rerun()
+
+        # --- RESUMO DE TODOS OS PROJETOS (chamadas simultâneas) ---
+        if api_key and st.button("✨ Resumir Todos os Projetos"):
+            with st.spinner(f"Resumindo {len(sel_projs)} projetos..."):
+                textos, cobertos = {}, {}
+                for p in sel_projs:
+                    ts = indice.linhas_projeto(area_sel, p)
+                    guardado = resumo_guardado(p, ts)
+                    if guardado:
+                        aplicar_resumo(p, guardado)
+                    else:
+                        textos[p], cobertos[p] = texto_para_ia(p, ts)
+                resultados = resumo_ia.gerar_resumos_em_lote(
+                    textos, api_key, st.session_state.sem, str_s2, forcar=forcar_ia
+                )
+                for p, secoes in resultados.items():
+                    aplicar_resumo_ia(p, secoes, cobertos[p])
+            st.rerun()
+
         for p in sel_projs:
             with st.expander(f"📂 {p}", expanded=True):
                 # INICIALIZAÇÃO DE VARIÁVEIS NA SESSÃO
@@ -347,46 +197,55 @@ with tab1:
                     if k not in st.session_state:
                         st.session_state[k] = ""
 
-                ts_prev = df_geral[
-                    (df_geral["Projeto"] == p)
-                    & (
-                        df_geral["Area"].astype(str).str.upper()
-                        == str(area_sel).upper()
-                    )
-                ]
+                ts_prev = indice.linhas_projeto(area_sel, p)
+
+                # --- RASCUNHO SEM IA ---
+                if not ts_prev.empty and st.button(f"⚡ Rascunho Rápido (sem IA) - {p}"):
+                    aplicar_resumo(p, resumo_ia.resumo_extrativo(ts_prev, dt, dt_s2_fim))
+                    st.rerun()
 
                 # --- BOTÃO GPT ---
                 if not ts_prev.empty and api_key:
                     if st.button(f"✨ Gerar Resumo Completo - {p}"):
-                        with st.spinner(f"Criando S+2 para {str_s2}..."):
-                            txt = ""
-                            for _, r in ts_prev.iterrows():
-                                txt += f"- {r['Tarefa']} ({r['Status']}) [Data: {r['Fim']}]: {r['Observacao']}\n"
+                        guardado = resumo_guardado(p, ts_prev)
+                        if guardado:
+                            aplicar_resumo(p, guardado)
+                            st.rerun()
+                        # Cada seção aparece assim que a IA termina de escrevê-la
+                        rotulos = {
+                            "ent": "Entregas",
+                            "trv": "Travas",
+                            "aca": "Ações (S+1)",
+                            "s2": f"S+2 para {p}",
+                        }
+                        vagas = {k: st.empty() for k in rotulos}
+
+                        def mostrar_secao(nome, texto):
+                            with vagas[nome].container():
+                                st.markdown(f"**{rotulos[nome]}**")
+                                st.text(texto)
 
-                            e, t, a, s2_predito = gerar_resumo_ia(
-                                txt, api_key, st.session_state.sem, str_s2
+                        with st.spinner(f"Criando S+2 para {str_s2}..."):
+                            txt, coberto = texto_para_ia(p, ts_prev)
+                            secoes = resumo_ia.gerar_resumo_ia_stream(
+                                txt,
+                                api_key,
+                                st.session_state.sem,
+                                str_s2,
+                                forcar=forcar_ia,
+                                ao_fechar_secao=mostrar_secao,
                             )
-
-                            # Atualiza Fonte da Verdade
-                            st.session_state[f"ent_{p}"] = e
-                            st.session_state[f"trv_{p}"] = t
-                            st.session_state[f"aca_{p}"] = a
-                            st.session_state[f"plan_s2_{p}"] = s2_predito
-
-                            # LIMPEZA DE CACHE DO WIDGET (O Segredo!)
-                            # Remove as chaves dos widgets para obrigar o Streamlit a ler o novo valor do session_state
-                            if f"widget_s2_tab1_{p}" in st.session_state:
-                                del st.session_state[f"widget_s2_tab1_{p}"]
-                            if f"widget_s2_tab4_{p}" in st.session_state:
-                                del st.session_state[f"widget_s2_tab4_{p}"]
-
+                            aplicar_resumo_ia(p, secoes, coberto)
                             st.success("Gerado!")
                             st.rerun()
 
                 if not ts_prev.empty:
                     tot = len(ts_prev)
                     done = len(ts_prev[ts_prev["Status"] == "Concluído"])
-                    st.caption(f"📊 {tot} Tarefas | ✅ {done} Concluídas")
+                    legenda = f"📊 {tot} Tarefas | ✅ {done} Concluídas"
+                    if f"tok_{p}" in st.session_state:
+                        legenda += f" | 🔢 {st.session_state[f'tok_{p}']} tokens enviados à IA"
+                    st.caption(legenda)
 
                 c1, c2 = st.columns(2)
                 ic = c1.file_uploader(f"Card ({p})", key=f"c_{p}")
@@ -463,178 +322,84 @@ with tab1:
     imp = st.text_area("Impacto")
     dir = st.text_area("Direcionamentos")
 
-    def pdf_gen():
-        pdf = PDF()
-        pdf.add_page()
-        pdf.set_auto_page_break(True, 20)
-
-        pdf.set_font("Arial", "B", 12)
-        pdf.set_text_color(*COR_VERDE_DBV)
-        pdf.cell(0, 5, f"AREA: {limpar_texto_pdf(area_sel.upper())}", ln=True)
-        pdf.set_font("Arial", size=10)
-        pdf.set_text_color(0, 0, 0)
-        pdf.cell(
-            0,
-            5,
-            f"Resp: {limpar_texto_pdf(resp)} | Sem: {st.session_state.sem}",
-            ln=True,
-        )
-        pdf.ln(5)
+    def bytes_upload(f):
+        # Upload lido já no rerun: o job roda em outra thread
+        return f.getvalue() if f else None
 
-        pdf.chapter_block(
-            "RESUMO EXECUTIVO",
-            limpar_texto_pdf(
-                f"Vitoria: {vit}\nRisco: {ris}\nDecisao: {dec}\nDependencias: {dep}"
+    def pdf_gen():
+        """Enfileira o PDF em segundo plano e retorna o ID do job."""
+        dados = {
+            "area": area_sel,
+            "resp": resp,
+            "sem": st.session_state.sem,
+            "str_s2": str_s2,
+            "vit": vit,
+            "ris": ris,
+            "dec": dec,
+            "dep": dep,
+            "up_geral": bytes_upload(up_geral),
+            "projetos": sel_projs,
+            "infos": {
+                p: dict(v, ic=bytes_upload(v["ic"]), ia=bytes_upload(v["ia"]))
+                for p, v in infos.items()
+            },
+            "up_rot": bytes_upload(up_rot),
+            "obs_rot": obs_rot,
+            "kpis": ed_kc.to_dict("records") + ed_ko.to_dict("records"),
+            "imp": imp,
+            "dir": dir,
+        }
+        area_pdf, projs_pdf = str(area_sel), list(sel_projs)
+        df_gantt, versao = indice.linhas(area_pdf, projs_pdf), dataset["versao"]
+        return fila_relatorios.submeter(
+            dados,
+            indice.linhas(area_sel),
+            lambda: relatorio_pdf.gerar_paginas_gantt(
+                df_gantt, area_pdf, projs_pdf, versao
             ),
-            COR_VERDE_DBV,
+            versao=versao,
         )
 
-        if up_geral:
-            p = salvar_imagem_temporaria(up_geral)
-            if p:
-                if pdf.get_y() > 200:
-                    pdf.add_page()
-                pdf.image(p, w=180)
-                pdf.ln(5)
-
-        pdf.set_font("Arial", "B", 11)
-        pdf.set_text_color(*COR_VERDE_DBV)
-        pdf.cell(0, 8, "DETALHAMENTO POR PROJETO", ln=True)
-        pdf.set_draw_color(*COR_DOURADO)
-        pdf.line(pdf.get_x(), pdf.get_y(), 200, pdf.get_y())
-        pdf.ln(3)
-
-        mask = df_geral["Area"].astype(str).str.upper() == str(area_sel).upper()
-        df_b = df_geral[mask].copy()
-
-        if not sel_projs:
-            pdf.set_text_color(0, 0, 0)
-            pdf.cell(0, 10, "Nenhum.", ln=True)
-        else:
-            for p in sel_projs:
-                if pdf.get_y() > 220:
-                    pdf.add_page()
-                pdf.ln(2)
-
-                pdf.set_font("Arial", "B", 14)
-                pdf.set_text_color(*COR_VERDE_DBV)
-                pdf.cell(0, 8, f"{limpar_texto_pdf(p)}", ln=True)
-                pdf.ln(2)
-
-                dm = infos.get(p, {})
-                ic, ia = dm.get("ic"), dm.get("ia")
-                if ic or ia:
-                    if pdf.get_y() > 180:
-                        pdf.add_page()
-                    y = pdf.get_y() + 2
-                    if ic:
-                        im = salvar_imagem_temporaria(ic)
-                        if im:
-                            pdf.image(im, x=10, y=y, w=90, h=50)
-                    if ia:
-                        im = salvar_imagem_temporaria(ia)
-                        if im:
-                            pdf.image(im, x=105, y=y, w=90, h=50)
-                    pdf.set_y(y + 55)
-
-                ent, trv, aca, ps2 = map(
-                    lambda x: limpar_texto_pdf(dm.get(x, "")),
-                    ["ent", "trv", "aca", "plan_s2"],
-                )
-                pdf.chapter_block("ENTREGAS (VISAO DO MOMENTO)", ent, COR_VERDE_DBV)
-                pdf.chapter_block("TRAVAS", trv, COR_VERMELHO_SUAVE)
-                pdf.chapter_block("PROXIMOS PASSOS (S+1)", aca, COR_DOURADO)
-
-                if ps2:
-                    pdf.chapter_block(
-                        f"PLANEJAMENTO S+2: {limpar_texto_pdf(p)} ({str_s2})",
-                        ps2,
-                        COR_AZUL_S2,
-                    )
-
-                ts = df_b[df_b["Projeto"] == p]
-                if not ts.empty:
-                    pdf.ln(2)
-                    pdf.set_font("Arial", "B", 9)
-                    pdf.set_text_color(0, 0, 0)
-                    pdf.set_fill_color(*COR_CINZA_CLARO)
-                    pdf.cell(30, 6, "STATUS", 1, 0, "C", True)
-                    pdf.cell(110, 6, "TAREFA", 1, 0, "L", True)
-                    pdf.cell(50, 6, "RESPONSAVEL", 1, 1, "L", True)
-                    pdf.set_font("Arial", "", 9)
-                    for _, r in ts.iterrows():
-                        stt = limpar_texto_pdf(r["Status"])
-                        tn = limpar_texto_pdf(str(r["Tarefa"]))[:65]
-                        rnm = limpar_texto_pdf(str(r["Responsavel"]))[:25]
-                        pdf.set_text_color(0, 0, 0)
-                        if "Concluído" in stt:
-                            pdf.set_text_color(0, 100, 0)
-                        elif "Atrasado" in stt:
-                            pdf.set_text_color(200, 0, 0)
-                        elif "Andamento" in stt:
-                            pdf.set_text_color(0, 0, 200)
-                        pdf.cell(30, 6, stt, 1, 0, "C")
-                        pdf.set_text_color(0, 0, 0)
-                        pdf.cell(110, 6, f" {tn}", 1, 0, "L")
-                        pdf.cell(50, 6, f" {rnm}", 1, 1, "L")
-                pdf.ln(5)
-
-        pdf.add_page()
-        pdf.chapter_block(
-            "KPIs & ROTINA", limpar_texto_pdf(f"Obs: {obs_rot}"), COR_VERDE_DBV
-        )
-        if up_rot:
-            im = salvar_imagem_temporaria(up_rot)
-            if im:
-                pdf.image(im, w=180)
-                pdf.ln(5)
-
-        pdf.set_font("Arial", size=9)
-        for dfk in [ed_kc, ed_ko]:
-            for _, r in dfk.iterrows():
-                if r["KPI"]:
-                    pdf.set_text_color(*COR_VERDE_DBV)
-                    pdf.cell(30, 6, limpar_texto_pdf(f"{r['KPI']}:"), 0)
-                    pdf.set_text_color(0, 0, 0)
-                    pdf.cell(
-                        0,
-                        6,
-                        limpar_texto_pdf(f"{r['Real']} / {r['Meta']} ({r['Leitura']})"),
-                        0,
-                        1,
-                    )
-
-        pdf.ln(5)
-        pdf.chapter_block(
-            "ENCERRAMENTO",
-            limpar_texto_pdf(f"Impacto:\n{imp}\n\nDirecionamentos:\n{dir}"),
-            COR_VERDE_DBV,
-        )
-
-        im = gerar_imagem_gantt(str(area_sel), sel_projs)
-        if im:
-            pdf.add_page()
-            pdf.image(im, x=10, y=10, w=190)
-        return pdf.output(dest="S").encode("latin-1", "replace")
-
     if st.button("📥 BAIXAR PDF", type="primary"):
         if area_sel and resp and sel_projs:
-            st.download_button(
-                "Salvar",
-                data=pdf_gen(),
-                file_name="Relatorio.pdf",
-                mime="application/pdf",
-            )
+            st.session_state.pdf_job = pdf_gen()
         else:
             st.error("Preencha tudo.")
 
+    # Só o progresso fica em polling; ao terminar, um rerun mostra o resultado
+    # fora do fragment e o polling para.
+    @st.fragment(run_every=1.0)
+    def progresso_pdf(job_id):
+        job = fila_relatorios.status(job_id)
+        if not job or job["estado"] != "rodando":
+            st.rerun()
+        st.progress(job["progresso"], text=f"⏳ Gerando PDF ({job['etapa']})...")
+
+    job = fila_relatorios.status(st.session_state.get("pdf_job"))
+    if job and job["estado"] == "rodando":
+        progresso_pdf(job["id"])
+    elif job and job["estado"] == "pronto":
+        origem = "cache" if job["etapa"] == "cache" else f"{job['duracao']:.1f}s"
+        st.download_button(
+            f"Salvar ({origem})",
+            data=job["pdf"],
+            file_name="Relatorio.pdf",
+            mime="application/pdf",
+            key=f"dl_{job['id']}",
+        )
+    elif job:
+        st.error(f"Erro ao gerar PDF: {job['erro']}")
+
 # === ABA 2 ===
 with tab2:
     st.markdown("### 🔄 Central")
-    if st.button("🔄 Puxar"):
+    cp1, cp2 = st.columns(2)
+    puxar = cp1.button("🔄 Puxar")
+    puxar_tudo = cp2.button("♻️ Sync Completo")
+    if puxar or puxar_tudo:
         with st.spinner("..."):
             importlib.reload(sync_notion)
-            s, m = sync_notion.rodar_sincronizacao()
+            s, m = sync_notion.rodar_sincronizacao(completo=puxar_tudo)
             if s:
                 st.success(m)
                 st.rerun()
@@ -644,18 +409,15 @@ with tab2:
     if not df_geral.empty:
         if areas and areas[0] != "Sincronize":
             ag = st.selectbox("1. Área:", areas)
-            dfa = df_geral[
-                df_geral["Area"].astype(str).str.upper() == str(ag).upper()
-            ].copy()
             p_ativos = [
                 p
-                for p in dfa["Projeto"].unique()
-                if not dfa[(dfa["Projeto"] == p) & (dfa["Status"] != "Concluído")].empty
+                for p in indice.projetos(ag)
+                if (indice.linhas_projeto(ag, p)["Status"] != "Concluído").any()
             ]
 
             if p_ativos:
                 pg = st.selectbox("2. Projeto:", p_ativos)
-                dff = dfa[dfa["Projeto"] == pg].sort_values("Inicio")
+                dff = indice.linhas_projeto(ag, pg).sort_values("Inicio")
 
                 st.markdown(f"#### {pg}")
                 fig = px.timeline(
@@ -692,34 +454,24 @@ with tab2:
 
                 if st.button("💾 Salvar"):
                     pb = st.progress(0)
-                    tot = len(edited)
-                    at = 0
                     importlib.reload(sync_notion)
-                    for i, (idx, r) in enumerate(edited.iterrows()):
-                        pid = r["page_id"]
-                        if pid in dff["page_id"].values:
-                            org = dff[dff["page_id"] == pid].iloc[0]
-                            if r["Status"] != org["Status"]:
-                                sync_notion.atualizar_tarefa_notion(
-                                    pid, "Status", r["Status"]
-                                )
-                                at += 1
-                            if r["Chat"] != org["Observacao"]:
-                                sync_notion.atualizar_tarefa_notion(
-                                    pid, "Observacao", r["Chat"]
-                                )
-                                at += 1
-                            if r["Tarefa"] != org["Tarefa"]:
-                                sync_notion.atualizar_tarefa_notion(
-                                    pid, "Tarefa", r["Tarefa"]
-                                )
-                                at += 1
-                        pb.progress((i + 1) / tot)
-                    if at > 0:
+                    alteracoes = sync_notion.diferencas(
+                        dff, edited.rename(columns={"Chat": "Observacao"})
+                    )
+                    resultados = sync_notion.salvar_alteracoes(
+                        alteracoes, progresso=pb.progress
+                    )
+                    at = sum(len(r["campos"]) for r in resultados if r["ok"])
+                    for r in resultados:
+                        if not r["ok"]:
+                            st.error(f"Falha em {r['page_id']}: {r['msg']}")
+                    local_falhou = [r for r in resultados if r.get("local") is False]
+                    if local_falhou:
+                        st.warning(f"{local_falhou[0]['msg']}. Use 🔄 Puxar para atualizar.")
+                    elif at > 0:
                         st.success(f"{at} salvos!")
-                        sync_notion.rodar_sincronizacao()
                         st.rerun()
-                    else:
+                    elif not resultados:
                         st.info("Nada mudou.")
             else:
                 st.info("Tudo concluído!")
@@ -760,27 +512,23 @@ with tab3:
             )
             if st.button("💾 Salvar Avulsas"):
                 importlib.reload(sync_notion)
-                cnt = 0
                 pbb = st.progress(0)
-                tott = len(edt)
-                for i, (idx, r) in enumerate(edt.iterrows()):
-                    pid = r["page_id"]
-                    if pid in dfa["page_id"].values:
-                        org = dfa[dfa["page_id"] == pid].iloc[0]
-                        if r["Chat"] != org["Observacao"]:
-                            sync_notion.atualizar_tarefa_notion(
-                                pid, "Observacao", r["Chat"]
-                            )
-                            cnt += 1
-                        if r["Status"] != org["Status"]:
-                            sync_notion.atualizar_tarefa_notion(
-                                pid, "Status", r["Status"]
-                            )
-                            cnt += 1
-                    pbb.progress((i + 1) / tott)
-                if cnt > 0:
+                alteracoes = sync_notion.diferencas(
+                    dfa.rename(columns={"Chat": "Observacao"}),
+                    edt.rename(columns={"Chat": "Observacao"}),
+                    ["Observacao", "Status"],
+                )
+                resultados = sync_notion.salvar_alteracoes(
+                    alteracoes, progresso=pbb.progress
+                )
+                for r in resultados:
+                    if not r["ok"]:
+                        st.error(f"Falha em {r['page_id']}: {r['msg']}")
+                local_falhou = [r for r in resultados if r.get("local") is False]
+                if local_falhou:
+                    st.warning(f"{local_falhou[0]['msg']}. Use 🔄 Puxar para atualizar.")
+                elif any(r["ok"] for r in resultados):
                     st.success("Salvo!")
-                    sync_notion.rodar_sincronizacao()
                     st.rerun()
         else:
             st.info("Nada.")
@@ -0,0 +1,335 @@
+"""
+Camada de armazenamento do dataset de tarefas.
+
+O app e os módulos de sync leem/gravam sempre por aqui. O backend padrão é
+SQLite (embutido, com índices em Area/Projeto/Status/Responsavel); o CSV
+continua disponível como backend simples e como formato de importação/exportação.
+
+Uso pela linha de comando:
+    python armazenamento.py exportar tarefas_dbv.csv
+    python armazenamento.py importar tarefas_dbv.csv
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+
+import pandas as pd
+
+CSV_FILE = "tarefas_dbv.csv"
+SQLITE_FILE = os.getenv("DBV_SQLITE_FILE", "tarefas_dbv.sqlite")
+BACKEND = os.getenv("DBV_STORAGE", "sqlite")
+
+# Falhas de leitura/gravação do dataset (para os `except` de quem chama)
+ERROS_ARMAZENAMENTO = (sqlite3.Error, OSError, pd.errors.ParserError)
+
+COLUNAS = [
+    "page_id",
+    "Area",
+    "Projeto",
+    "Tarefa",
+    "Responsavel",
+    "Inicio",
+    "Fim",
+    "Status",
+    "Status_Original",
+    "Observacao",
+]
+
+
+def chave_area(area):
+    """Chave normalizada usada para comparar áreas sem diferenciar caixa."""
+    return str(area).strip().upper()
+
+
+# Lido uma vez no import: os.umask só consulta trocando o valor do processo
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _modo_arquivo(caminho):
+    """Permissões do arquivo existente, ou o padrão do umask para um arquivo novo."""
+    try:
+        return os.stat(caminho).st_mode & 0o777
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
+
+
+def _normalizar(df):
+    df = df.copy()
+    for c in COLUNAS:
+        if c not in df.columns:
+            df[c] = None
+    df = df[COLUNAS]
+    return df.astype(object).where(df.notna(), None)
+
+
+class ArmazenamentoCSV:
+    """Backend simples: o arquivo inteiro é lido e regravado a cada operação."""
+
+    def __init__(self, caminho=CSV_FILE):
+        self.caminho = caminho
+
+    def existe(self):
+        return os.path.exists(self.caminho)
+
+    def _ler_tudo(self):
+        if not self.existe():
+            return pd.DataFrame(columns=COLUNAS)
+        return pd.read_csv(self.caminho)
+
+    def ler(self, areas=None, projetos=None, status=None, responsavel=None, ids=None):
+        df = self._ler_tudo()
+        if df.empty:
+            return df
+        if ids is not None:
+            df = df[df["page_id"].isin(list(ids))]
+        if areas:
+            chaves = {chave_area(a) for a in areas}
+            df = df[df["Area"].map(chave_area).isin(chaves)]
+        if projetos:
+            df = df[df["Projeto"].isin(projetos)]
+        if status:
+            df = df[df["Status"].isin(status)]
+        if responsavel:
+            df = df[df["Responsavel"].astype(str).str.contains(responsavel, regex=False)]
+        return df.reset_index(drop=True)
+
+    def versao(self):
+        """Muda sempre que o arquivo é publicado (inode + mtime + tamanho)."""
+        if not self.existe():
+            return None
+        st = os.stat(self.caminho)
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def listar_ids(self):
+        return set(self._ler_tudo()["page_id"].dropna())
+
+    def contar(self):
+        return len(self._ler_tudo())
+
+    def substituir(self, df):
+        # Grava num temporário e publica com rename atômico: quem estiver
+        # lendo vê o arquivo antigo ou o novo inteiro, nunca um pela metade
+        pasta = os.path.dirname(os.path.abspath(self.caminho))
+        fd, tmp = tempfile.mkstemp(dir=pasta, suffix=".csv.tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+                df.to_csv(f, index=False)
+            # mkstemp cria com 0600; o publicado mantém as permissões de antes
+            os.chmod(tmp, _modo_arquivo(self.caminho))
+            os.replace(tmp, self.caminho)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def aplicar_delta(self, df_novas, ids_removidos=()):
+        df = self._ler_tudo()
+        remover = set(ids_removidos)
+        if df_novas is not None and not df_novas.empty:
+            remover |= set(df_novas["page_id"])
+        df = df[~df["page_id"].isin(remover)]
+        if df_novas is not None and not df_novas.empty:
+            df = pd.concat([df, df_novas], ignore_index=True)
+        self.substituir(df)
+
+
+class ArmazenamentoSQLite:
+    """Backend indexado: leituras filtradas não carregam a tabela inteira."""
+
+    def __init__(self, caminho=SQLITE_FILE, csv_inicial=CSV_FILE):
+        self.caminho = caminho
+        self.csv_inicial = csv_inicial
+
+    def _conectar(self):
+        con = sqlite3.connect(self.caminho, timeout=30)
+        # Sempre: o arquivo existir não garante que quem o criou já fez o schema
+        # (outra thread/processo pode estar no meio). Tudo é IF NOT EXISTS.
+        self._criar_schema(con)
+        if con.execute("PRAGMA user_version").fetchone()[0] == 0:
+            self._semear(con)
+        return con
+
+    def _semear(self, con):
+        """Importa o CSV inicial num banco nunca gravado; um só processo faz isso."""
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            vazio = con.execute("SELECT COUNT(*) FROM tarefas").fetchone()[0] == 0
+            if con.execute("PRAGMA user_version").fetchone()[0] == 0 and vazio:
+                if self.csv_inicial and os.path.exists(self.csv_inicial):
+                    self._inserir(con, pd.read_csv(self.csv_inicial))
+                # Marca como inicializado mesmo sem CSV: as próximas conexões pulam isto
+                self._nova_geracao(con)
+            con.commit()
+        except BaseException:
+            con.rollback()
+            raise
+
+    def _criar_schema(self, con):
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tarefas (
+                page_id TEXT PRIMARY KEY,
+                Area TEXT,
+                area_key TEXT,
+                Projeto TEXT,
+                Tarefa TEXT,
+                Responsavel TEXT,
+                Inicio TEXT,
+                Fim TEXT,
+                Status TEXT,
+                Status_Original TEXT,
+                Observacao TEXT
+            )
+            """
+        )
+        con.execute("CREATE INDEX IF NOT EXISTS idx_area ON tarefas (area_key, Projeto)")
+        con.execute("CREATE INDEX IF NOT EXISTS idx_projeto ON tarefas (Projeto)")
+        con.execute("CREATE INDEX IF NOT EXISTS idx_status ON tarefas (Status)")
+        con.execute("CREATE INDEX IF NOT EXISTS idx_resp ON tarefas (Responsavel)")
+
+    def _inserir(self, con, df):
+        df = _normalizar(df)
+        linhas = [
+            tuple(r[:2]) + (chave_area(r[1]) if r[1] is not None else None,) + tuple(r[2:])
+            for r in df.itertuples(index=False, name=None)
+        ]
+        colunas = COLUNAS[:2] + ["area_key"] + COLUNAS[2:]
+        marcadores = ", ".join("?" for _ in colunas)
+        con.executemany(
+            f"INSERT OR REPLACE INTO tarefas ({', '.join(colunas)}) VALUES ({marcadores})",
+            linhas,
+        )
+
+    def existe(self):
+        return os.path.exists(self.caminho) or os.path.exists(self.csv_inicial or "")
+
+    def ler(self, areas=None, projetos=None, status=None, responsavel=None, ids=None):
+        where, params = [], []
+        if ids is not None:
+            ids = list(ids)
+            where.append(f"page_id IN ({', '.join('?' for _ in ids)})" if ids else "0")
+            params += ids
+        if areas:
+            where.append(f"area_key IN ({', '.join('?' for _ in areas)})")
+            params += [chave_area(a) for a in areas]
+        if projetos:
+            where.append(f"Projeto IN ({', '.join('?' for _ in projetos)})")
+            params += list(projetos)
+        if status:
+            where.append(f"Status IN ({', '.join('?' for _ in status)})")
+            params += list(status)
+        if responsavel:
+            where.append("Responsavel LIKE ?")
+            params.append(f"%{responsavel}%")
+        sql = f"SELECT {', '.join(COLUNAS)} FROM tarefas"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY rowid"
+        con = self._conectar()
+        try:
+            return pd.read_sql_query(sql, con, params=params)
+        finally:
+            con.close()
+
+    def versao(self):
+        """Geração dos dados: incrementada a cada gravação (PRAGMA user_version)."""
+        con = self._conectar()
+        try:
+            return con.execute("PRAGMA user_version").fetchone()[0]
+        finally:
+            con.close()
+
+    def _nova_geracao(self, con):
+        geracao = con.execute("PRAGMA user_version").fetchone()[0]
+        con.execute(f"PRAGMA user_version = {int(geracao) + 1}")
+
+    def listar_ids(self):
+        con = self._conectar()
+        try:
+            return {r[0] for r in con.execute("SELECT page_id FROM tarefas")}
+        finally:
+            con.close()
+
+    def contar(self):
+        con = self._conectar()
+        try:
+            return con.execute("SELECT COUNT(*) FROM tarefas").fetchone()[0]
+        finally:
+            con.close()
+
+    def substituir(self, df):
+        con = self._conectar()
+        try:
+            with con:
+                con.execute("DELETE FROM tarefas")
+                self._inserir(con, df)
+                self._nova_geracao(con)
+        finally:
+            con.close()
+
+    def aplicar_delta(self, df_novas, ids_removidos=()):
+        """Upsert das linhas novas/alteradas e remoção das excluídas, numa transação."""
+        con = self._conectar()
+        try:
+            with con:
+                if ids_removidos:
+                    con.executemany(
+                        "DELETE FROM tarefas WHERE page_id = ?",
+                        [(i,) for i in ids_removidos],
+                    )
+                if df_novas is not None and not df_novas.empty:
+                    self._inserir(con, df_novas)
+                self._nova_geracao(con)
+        finally:
+            con.close()
+
+
+def obter_armazenamento():
+    """Backend configurado em DBV_STORAGE ("sqlite" ou "csv")."""
+    if BACKEND == "csv":
+        return ArmazenamentoCSV()
+    return ArmazenamentoSQLite()
+
+
+def carregar_tarefas(areas=None, projetos=None, armazenamento=None):
+    """Tarefas prontas para o app/relatórios (datas como date, vazios tratados)."""
+    loja = armazenamento or obter_armazenamento()
+    if not loja.existe():
+        return pd.DataFrame(columns=COLUNAS)
+    # Filtros vão para o banco (índices), sem carregar a tabela toda
+    df = loja.ler(areas=areas, projetos=projetos)
+    for c in COLUNAS:
+        if c not in df.columns:
+            df[c] = ""
+    if not df.empty:
+        df["Inicio"] = pd.to_datetime(df["Inicio"], errors="coerce").dt.date
+        df["Fim"] = pd.to_datetime(df["Fim"], errors="coerce").dt.date
+        df["Observacao"] = df["Observacao"].fillna("")
+        df["Responsavel"] = df["Responsavel"].fillna("-")
+    return df
+
+
+def exportar_csv(caminho, armazenamento=None):
+    df = (armazenamento or obter_armazenamento()).ler()
+    df.dropna(axis=1, how="all").to_csv(caminho, index=False)
+    return len(df)
+
+
+def importar_csv(caminho, armazenamento=None):
+    df = pd.read_csv(caminho)
+    (armazenamento or obter_armazenamento()).substituir(df)
+    return len(df)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] not in ("exportar", "importar"):
+        print(__doc__)
+        sys.exit(1)
+    acao, arquivo = sys.argv[1], sys.argv[2]
+    if acao == "exportar":
+        print(f"{exportar_csv(arquivo)} tarefas exportadas para {arquivo}")
+    else:
+        print(f"{importar_csv(arquivo)} tarefas importadas de {arquivo}")
@@ -0,0 +1,127 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+class CacheDisco:
+    """
+    Cache chave -> valor persistido em um arquivo JSON.
+
+    Cada entrada guarda uma `versao` opcional (ex: last_edited_time da página):
+    se a versão pedida mudar, a entrada é considerada velha. Também expira por
+    TTL e, ao passar de `max_entradas`, descarta as menos acessadas (LRU).
+    """
+
+    def __init__(self, caminho, ttl_segundos=None, max_entradas=10000):
+        self.caminho = caminho
+        self.ttl_segundos = ttl_segundos
+        self.max_entradas = max_entradas
+        self.hits = 0
+        self.misses = 0
+        self._entradas = None
+        self._sujo = False
+        self._lock = threading.RLock()
+
+    def _carregar(self):
+        if self._entradas is not None:
+            return
+        self._entradas = {}
+        if os.path.exists(self.caminho):
+            try:
+                with open(self.caminho, encoding="utf-8") as f:
+                    self._entradas = json.load(f)
+            except (OSError, ValueError):
+                self._entradas = {}
+
+    def _expirada(self, entrada, agora):
+        if not self.ttl_segundos:
+            return False
+        return agora - entrada.get("gravado", 0) > self.ttl_segundos
+
+    def obter(self, chave, versao=None):
+        """Retorna o valor guardado ou None (conta hit/miss)."""
+        with self._lock:
+            self._carregar()
+            agora = time.time()
+            entrada = self._entradas.get(chave)
+            if (
+                entrada is None
+                or entrada.get("versao") != versao
+                or self._expirada(entrada, agora)
+            ):
+                self.misses += 1
+                return None
+            entrada["acesso"] = agora
+            self._sujo = True
+            self.hits += 1
+            return entrada["valor"]
+
+    def gravar(self, chave, valor, versao=None):
+        with self._lock:
+            self._carregar()
+            agora = time.time()
+            self._entradas[chave] = {
+                "valor": valor,
+                "versao": versao,
+                "gravado": agora,
+                "acesso": agora,
+            }
+            self._sujo = True
+            self._despejar()
+
+    def remover(self, chave):
+        with self._lock:
+            self._carregar()
+            if self._entradas.pop(chave, None) is not None:
+                self._sujo = True
+
+    def valores(self):
+        """Valores ainda válidos (sem contar hit/miss)."""
+        with self._lock:
+            self._carregar()
+            agora = time.time()
+            return [
+                e["valor"]
+                for e in self._entradas.values()
+                if not self._expirada(e, agora)
+            ]
+
+    def _despejar(self):
+        excesso = len(self._entradas) - self.max_entradas
+        if excesso <= 0:
+            return
+        # Descarta ~10% a mais para não reordenar a cada gravação
+        excesso += self.max_entradas // 10
+        velhas = sorted(self._entradas.items(), key=lambda kv: kv[1].get("acesso", 0))
+        for chave, _ in velhas[:excesso]:
+            del self._entradas[chave]
+
+    def salvar(self):
+        """Grava no disco (escrita atômica) se algo mudou."""
+        with self._lock:
+            if not self._sujo or self._entradas is None:
+                return
+            pasta = os.path.dirname(os.path.abspath(self.caminho))
+            fd, tmp = tempfile.mkstemp(dir=pasta, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(self._entradas, f, ensure_ascii=False)
+                os.replace(tmp, self.caminho)
+            except OSError:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+            self._sujo = False
+
+    def estatisticas(self):
+        with self._lock:
+            self._carregar()
+            total = self.hits + self.misses
+            return {
+                "entradas": len(self._entradas),
+                "hits": self.hits,
+                "misses": self.misses,
+                "taxa_hit": (self.hits / total) if total else 0.0,
+            }
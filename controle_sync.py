@@ -0,0 +1,43 @@
+"""
+Execução única (single-flight) dos syncs dentro do processo do app.
+
+Se dois usuários clicam em "Puxar" ao mesmo tempo, só uma varredura roda:
+quem chega durante a execução espera por ela e recebe o mesmo resultado.
+Fica fora de sync_notion porque o app faz importlib.reload nele.
+"""
+import threading
+from concurrent.futures import Future
+
+_lock = threading.Lock()
+_em_andamento = {}
+
+
+def executar_unico(chave, funcao, *args, **kwargs):
+    """
+    Roda `funcao(*args, **kwargs)` uma vez por `chave`; chamadas concorrentes
+    com a mesma chave se juntam à que já está rodando.
+    Retorna (resultado, juntou) — `juntou` é True para quem só esperou.
+    """
+    with _lock:
+        futuro = _em_andamento.get(chave)
+        dono = futuro is None
+        if dono:
+            futuro = Future()
+            _em_andamento[chave] = futuro
+    if not dono:
+        return futuro.result(), True
+    try:
+        resultado = funcao(*args, **kwargs)
+        futuro.set_result(resultado)
+        return resultado, False
+    except BaseException as e:
+        futuro.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            _em_andamento.pop(chave, None)
+
+
+def em_andamento(chave):
+    with _lock:
+        return chave in _em_andamento
@@ -0,0 +1,50 @@
+import os
+import time
+
+from cache_disco import CacheDisco
+
+# Diretório de usuários do workspace compartilhado pelos módulos de sync.
+# Fica fora de sync_notion para sobreviver ao importlib.reload do app.
+USUARIOS_FILE = "usuarios_notion.json"
+USUARIOS_TTL = int(os.getenv("NOTION_USERS_TTL", str(12 * 3600)))
+
+_CHAVE_LISTAGEM = "__listagem__"
+
+diretorio = CacheDisco(USUARIOS_FILE, ttl_segundos=USUARIOS_TTL, max_entradas=5000)
+
+
+def carregar_usuarios(notion, forcar=False):
+    """
+    Baixa todos os usuários do workspace (users.list paginado) de uma vez.
+    Não faz nada se a última listagem ainda estiver dentro do TTL.
+    Retorna quantos usuários foram gravados.
+    """
+    if not forcar and diretorio.obter(_CHAVE_LISTAGEM) is not None:
+        return 0
+    total = 0
+    has_more = True
+    next_cursor = None
+    while has_more:
+        resp = notion.users.list(start_cursor=next_cursor, page_size=100)
+        for u in resp.get("results", []):
+            if u.get("id") and u.get("name"):
+                diretorio.gravar(u["id"], u["name"])
+                total += 1
+        has_more = resp.get("has_more")
+        next_cursor = resp.get("next_cursor")
+    diretorio.gravar(_CHAVE_LISTAGEM, time.time())
+    diretorio.salvar()
+    return total
+
+
+def nome_usuario(user_id):
+    """Nome já conhecido ou None."""
+    if not user_id:
+        return None
+    return diretorio.obter(user_id)
+
+
+def registrar_usuario(user_id, nome):
+    """Guarda um usuário resolvido individualmente (ex: convidado fora do users.list)."""
+    if user_id and nome:
+        diretorio.gravar(user_id, nome)
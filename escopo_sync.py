@@ -0,0 +1,106 @@
+"""
+Escopo dos syncs: quais páginas pedir ao Notion e quais propriedades trazer.
+
+    SYNC_ESCOPO=tudo       banco inteiro (padrão)
+    SYNC_ESCOPO=recentes   abertas + concluídas/editadas nas últimas
+                           SYNC_ESCOPO_SEMANAS semanas (padrão 8)
+
+O escopo vira filtro da própria consulta (o Notion nem envia o resto) e a
+resposta vem só com as propriedades que os syncs leem (filter_properties).
+Os dois dependem do esquema do banco (IDs e opções), lido uma vez por hora;
+sem esquema, a consulta segue como antes, sem filtro nem projeção.
+"""
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+import notion_gateway
+
+ESCOPO = os.getenv("SYNC_ESCOPO", "tudo").strip().lower()
+SEMANAS = int(os.getenv("SYNC_ESCOPO_SEMANAS", "8"))
+ESQUEMA_TTL = 3600
+
+_esquemas = {}
+_lock = threading.Lock()
+
+
+def descricao():
+    """Identifica o escopo atual (muda => o próximo sync precisa ser completo)."""
+    return f"recentes:{SEMANAS}" if ESCOPO == "recentes" else "tudo"
+
+
+def esquema(notion, db_id):
+    """{nome: propriedade} do banco (cache por processo); None se não der para ler."""
+    with _lock:
+        guardado = _esquemas.get(db_id)
+        if guardado and time.monotonic() - guardado[0] < ESQUEMA_TTL:
+            return guardado[1]
+    try:
+        props = notion.databases.retrieve(database_id=db_id).get("properties") or None
+    except notion_gateway.ERROS_NOTION as e:
+        print(f"   Esquema de {db_id} indisponível ({e}): consulta sem filtro/projeção")
+        return None
+    with _lock:
+        _esquemas[db_id] = (time.monotonic(), props)
+    return props
+
+
+def _achar(props, nome):
+    """Nome real da propriedade, sem diferenciar maiúsculas (como o safe_get das demandas)."""
+    return next((k for k in props if k.lower() == nome.lower()), None)
+
+
+def projecao(notion, db_id, nomes):
+    """IDs das propriedades `nomes` que existem no banco, para filter_properties (None = todas)."""
+    props = esquema(notion, db_id)
+    if not props:
+        return None
+    ids = [props[k]["id"] for k in filter(None, (_achar(props, n) for n in nomes))]
+    return sorted(set(ids)) or None
+
+
+def filtro(notion, db_id, prop_status, eh_concluido, props_data, hoje=None):
+    """
+    Filtro do Notion para o escopo atual (None = sem filtro). No escopo
+    "recentes": status fora das opções concluídas OU data (`props_data`) a
+    partir do corte OU página editada a partir do corte.
+    """
+    if ESCOPO != "recentes":
+        return None
+    props = esquema(notion, db_id)
+    status = _achar(props, prop_status) if props else None
+    if not status or props[status]["type"] not in ("select", "status"):
+        return None
+    tipo = props[status]["type"]
+    concluidas = [o["name"] for o in props[status][tipo].get("options", []) if eh_concluido(o["name"])]
+    if not concluidas:
+        return None
+
+    corte = ((hoje or date.today()) - timedelta(weeks=SEMANAS)).isoformat()
+    abertas = [{"property": status, tipo: {"does_not_equal": n}} for n in concluidas]
+    condicoes = [abertas[0] if len(abertas) == 1 else {"and": abertas}]
+    for nome in props_data:
+        real = _achar(props, nome)
+        if real and props[real]["type"] == "date":
+            condicoes.append({"property": real, "date": {"on_or_after": corte}})
+    condicoes.append(
+        {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": corte}}
+    )
+    return {"or": condicoes}
+
+
+def combinar(*filtros):
+    """
+    Junta filtros com AND, ignorando os vazios. O Notion aceita só dois níveis
+    de filtro composto: um OR (como o do escopo) recebe os demais dentro de
+    cada ramo, em vez de ficar embaixo de um AND (and -> or -> and = 3 níveis).
+    """
+    filtros = [f for f in filtros if f]
+    if len(filtros) <= 1:
+        return filtros[0] if filtros else None
+    ous = [f for f in filtros if "or" in f]
+    termos = [t for f in filtros if "or" not in f for t in f.get("and", [f])]
+    if len(ous) != 1:
+        return {"and": filtros}
+    return {"or": [{"and": ramo.get("and", [ramo]) + termos} for ramo in ous[0]["or"]]}
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import relatorio_pdf
+
+# Geração de PDF fora do rerun do Streamlit: o job continua rodando mesmo que
+# o usuário mexa em outro widget, e o resultado fica guardado para download.
+PDF_WORKERS = 2
+MAX_JOBS = 50
+MAX_RESULTADOS = 8
+
+_executor = ThreadPoolExecutor(max_workers=PDF_WORKERS, thread_name_prefix="pdf")
+_lock = threading.Lock()
+_jobs = OrderedDict()
+_resultados = OrderedDict()
+_em_andamento = {}
+
+
+def _serializavel(valor):
+    if isinstance(valor, (bytes, bytearray)):
+        return "sha256:" + hashlib.sha256(valor).hexdigest()
+    if isinstance(valor, dict):
+        return {str(k): _serializavel(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [_serializavel(v) for v in valor]
+    if valor is None or isinstance(valor, (str, int, float, bool)):
+        return valor
+    return str(valor)
+
+
+def impressao_digital(dados, versao):
+    """Hash das entradas do relatório (imagens pelo conteúdo) + versão dos dados."""
+    bruto = json.dumps(
+        {"dados": _serializavel(dados), "versao": _serializavel(versao)},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(bruto.encode("utf-8")).hexdigest()
+
+
+def _novo_job(chave, estado="rodando"):
+    job = {
+        "id": uuid.uuid4().hex[:12],
+        "chave": chave,
+        "estado": estado,
+        "etapa": "fila",
+        "progresso": 0.0,
+        "pdf": None,
+        "erro": None,
+        "criado_em": time.time(),
+        "duracao": None,
+    }
+    _jobs[job["id"]] = job
+    # Descarta os mais antigos já terminados; job rodando nunca sai
+    terminados = [i for i, j in _jobs.items() if j["estado"] != "rodando"]
+    for job_id in terminados[: max(0, len(_jobs) - MAX_JOBS)]:
+        del _jobs[job_id]
+    return job
+
+
+def _executar(job, dados, df_area, paginas_gantt):
+    def progresso(etapa, fracao):
+        job["etapa"] = etapa
+        job["progresso"] = fracao
+
+    try:
+        pdf = relatorio_pdf.montar_relatorio(dados, df_area, paginas_gantt, progresso)
+        with _lock:
+            _resultados[job["chave"]] = pdf
+            _resultados.move_to_end(job["chave"])
+            while len(_resultados) > MAX_RESULTADOS:
+                _resultados.popitem(last=False)
+            job["pdf"] = pdf
+            job["estado"] = "pronto"
+            job["etapa"] = "pronto"
+            job["progresso"] = 1.0
+    except Exception as e:
+        job["estado"] = "erro"
+        job["erro"] = str(e)
+    finally:
+        job["duracao"] = time.time() - job["criado_em"]
+        with _lock:
+            _em_andamento.pop(job["chave"], None)
+
+
+def submeter(dados, df_area, paginas_gantt, versao=None):
+    """
+    Enfileira a geração do PDF e retorna o ID do job. Se as mesmas entradas já
+    geraram um PDF, o job nasce pronto; se estão sendo geradas, reaproveita o job.
+    `paginas_gantt` pode ser uma função (chamada só na etapa do cronograma).
+    """
+    chave = impressao_digital(dados, versao)
+    with _lock:
+        if chave in _resultados:
+            _resultados.move_to_end(chave)
+            job = _novo_job(chave, estado="pronto")
+            job.update(pdf=_resultados[chave], etapa="cache", progresso=1.0, duracao=0.0)
+            return job["id"]
+        if chave in _em_andamento:
+            return _em_andamento[chave]
+        job = _novo_job(chave)
+        _em_andamento[chave] = job["id"]
+    _executor.submit(_executar, job, dados, df_area, paginas_gantt)
+    return job["id"]
+
+
+def status(job_id):
+    """Cópia do estado do job (ou None se não existir/expirou)."""
+    with _lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
@@ -0,0 +1,127 @@
+"""
+Gera o PDF de cada área sem passar pelo Streamlit.
+
+    python gerar_relatorios.py entradas.json --saida relatorios --workers 4
+
+O arquivo de entradas (JSON, ou YAML se o PyYAML estiver instalado) segue os
+mesmos campos do formulário da aba 1:
+
+    {
+      "semana_inicio": "2026-10-12",
+      "areas": [
+        {
+          "area": "B.I",
+          "resp": "Fulano",
+          "vit": "...", "ris": "...", "dec": "...", "dep": "...",
+          "up_geral": "imagens/bi_geral.png",
+          "projetos": ["DBV Educa"],
+          "infos": {"DBV Educa": {"ic": "card.png", "ia": "ativ.png",
+                                  "ent": "...", "trv": "...", "aca": "...",
+                                  "plan_s2": "..."}},
+          "up_rot": null, "obs_rot": "...",
+          "kpis": [{"KPI": "SLA", "Meta": "2h", "Real": "1h", "Leitura": "Bom"}],
+          "imp": "...", "dir": "..."
+        }
+      ]
+    }
+
+Sem "projetos", entram todos os projetos da área.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+
+import armazenamento
+import relatorio_pdf
+
+
+def ler_entradas(caminho):
+    with open(caminho, encoding="utf-8") as f:
+        if caminho.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                sys.exit("PyYAML não instalado: use um arquivo .json")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def semanas(inicio):
+    """Mesmos rótulos da aba 1: semana atual e S+2."""
+    sem = f"{inicio.strftime('%d/%m')} a {(inicio + timedelta(days=4)).strftime('%d/%m')}"
+    s2_inicio = inicio + timedelta(days=14)
+    str_s2 = f"{s2_inicio.strftime('%d/%m')} a {(s2_inicio + timedelta(days=4)).strftime('%d/%m')}"
+    return sem, str_s2
+
+
+def gerar_relatorio_area(dados, pasta_saida):
+    """Roda em um processo do pool: lê só a área, monta e grava o PDF."""
+    t0 = time.perf_counter()
+    area = dados["area"]
+    df_area = armazenamento.carregar_tarefas(areas=[area])
+    if not dados.get("projetos"):
+        dados["projetos"] = df_area["Projeto"].dropna().unique().tolist()
+    paginas = relatorio_pdf.gerar_paginas_gantt(
+        df_area[df_area["Projeto"].isin(dados["projetos"])],
+        area,
+        dados["projetos"],
+        paralelo=False,
+    )
+    pdf = relatorio_pdf.montar_relatorio(dados, df_area, paginas)
+    nome = re.sub(r"[^\w.-]+", "_", str(area)).strip("_") or "area"
+    caminho = os.path.join(pasta_saida, f"Relatorio_{nome}.pdf")
+    with open(caminho, "wb") as f:
+        f.write(pdf)
+    return area, caminho, len(df_area), time.perf_counter() - t0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera os relatórios PDF de todas as áreas.")
+    parser.add_argument("entradas", help="arquivo JSON/YAML com os campos de cada área")
+    parser.add_argument("--saida", default="relatorios", help="pasta dos PDFs")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args(argv)
+
+    cfg = ler_entradas(args.entradas)
+    inicio = cfg.get("semana_inicio")
+    inicio = date.fromisoformat(inicio) if inicio else date.today()
+    sem, str_s2 = semanas(inicio)
+    os.makedirs(args.saida, exist_ok=True)
+
+    areas = []
+    for item in cfg.get("areas", []):
+        dados = dict(item)
+        dados.setdefault("sem", sem)
+        dados.setdefault("str_s2", str_s2)
+        areas.append(dados)
+    if not areas:
+        print("Nenhuma área no arquivo de entradas.")
+        return 1
+
+    # Cria/semeia o banco aqui, uma vez: os processos do pool só leem
+    loja = armazenamento.obter_armazenamento()
+    if loja.existe():
+        loja.versao()
+
+    t0 = time.perf_counter()
+    falhas = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futuros = {pool.submit(gerar_relatorio_area, d, args.saida): d["area"] for d in areas}
+        for fut in as_completed(futuros):
+            try:
+                area, caminho, n, dur = fut.result()
+                print(f"✅ {area}: {dur:.1f}s ({n} tarefas) -> {caminho}")
+            except Exception as e:
+                falhas += 1
+                print(f"❌ {futuros[fut]}: {e}")
+    print(f"{len(areas) - falhas}/{len(areas)} relatórios em {time.perf_counter() - t0:.1f}s")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+import numpy as np
+
+from armazenamento import chave_area
+
+
+class IndiceAreas:
+    """
+    Índice (área normalizada) -> projeto -> posições das linhas no DataFrame.
+
+    Construído uma vez por versão do dataset; as abas e o PDF consultam por
+    aqui em vez de refazer `.astype(str).str.upper()` na tabela inteira.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        # Mesma normalização de armazenamento.chave_area, vetorizada
+        chaves = df["Area"].astype(str).str.strip().str.upper()
+        df["Area_Key"] = chaves.astype("category")
+        grupos = df.groupby([chaves, "Projeto"], sort=False, dropna=False).indices
+        self._areas = {}
+        for (area, projeto), posicoes in sorted(grupos.items(), key=lambda kv: kv[1][0]):
+            self._areas.setdefault(area, {})[projeto] = posicoes
+        self._cache_area = {}
+
+    def projetos(self, area):
+        """Projetos da área, na ordem em que aparecem no dataset."""
+        return list(self._areas.get(chave_area(area), {}).keys())
+
+    def posicoes(self, area, projetos=None):
+        grupos = self._areas.get(chave_area(area), {})
+        if projetos is None:
+            chave = chave_area(area)
+            if chave not in self._cache_area:
+                self._cache_area[chave] = self._juntar(list(grupos.values()))
+            return self._cache_area[chave]
+        return self._juntar([grupos[p] for p in projetos if p in grupos])
+
+    @staticmethod
+    def _juntar(partes):
+        if not partes:
+            return np.array([], dtype=int)
+        return np.sort(np.concatenate(partes))
+
+    def linhas(self, area, projetos=None):
+        """Linhas da área (opcionalmente só dos projetos pedidos), na ordem original."""
+        return self.df.iloc[self.posicoes(area, projetos)]
+
+    def linhas_projeto(self, area, projeto):
+        return self.linhas(area, [projeto])
+
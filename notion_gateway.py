@@ -0,0 +1,206 @@
+"""
+Cliente Notion compartilhado pelo processo.
+
+Todos os módulos (sync de tarefas, sync de demandas, verificação de colunas,
+gravações do app) pedem o cliente aqui, então:
+- um único orçamento de requisições (balde de tokens, ~3 req/s do Notion);
+- 429 é repetido com backoff + jitter, respeitando o Retry-After; 5xx e
+  timeouts só nas chamadas idempotentes;
+- um só pool de conexões HTTP (httpx.Client) reaproveitado;
+- contagem de chamadas e histograma de latência por endpoint.
+
+Como mora fora de sync_notion, sobrevive ao importlib.reload do app.
+"""
+import os
+import random
+import re
+import threading
+import time
+
+import httpx
+from notion_client import Client
+from notion_client.errors import HTTPResponseError, RequestTimeoutError
+
+NOTION_RPS = float(os.getenv("NOTION_RPS", os.getenv("NOTION_COMMENT_RPS", "3")))
+NOTION_RAJADA = int(os.getenv("NOTION_RAJADA", "3"))
+NOTION_TENTATIVAS = int(os.getenv("NOTION_TENTATIVAS", "5"))
+NOTION_TIMEOUT = float(os.getenv("NOTION_TIMEOUT", "60"))
+# Teto de uma espera entre tentativas (Retry-After muito grande não trava o app)
+ESPERA_MAXIMA = 60.0
+
+# Falhas que sobram depois das novas tentativas (para os `except` dos módulos)
+ERROS_NOTION = (HTTPResponseError, RequestTimeoutError, httpx.TransportError)
+
+LIMITES_LATENCIA_MS = (100, 250, 500, 1000, 2500, 5000)
+
+_RE_ID = re.compile(r"^[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}$")
+
+
+class BaldeTokens:
+    """Limita a taxa média (`taxa`/s) permitindo rajadas de até `capacidade`."""
+
+    def __init__(self, taxa, capacidade):
+        self.taxa = taxa
+        self.capacidade = max(1, capacidade)
+        self._tokens = float(self.capacidade)
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reabastecer(self):
+        agora = time.monotonic()
+        self._tokens = min(self.capacidade, self._tokens + (agora - self._ultimo) * self.taxa)
+        self._ultimo = agora
+
+    def aguardar(self):
+        with self._lock:
+            self._reabastecer()
+            # Reserva o token já (pode ficar negativo): quem chega depois espera mais
+            self._tokens -= 1
+            espera = -self._tokens / self.taxa if self._tokens < 0 else 0.0
+        if espera > 0:
+            time.sleep(espera)
+
+    def pausar(self, segundos):
+        """Depois de um 429, ninguém do processo chama até passar `segundos`."""
+        with self._lock:
+            # Conta o tempo até agora antes: senão o próximo aguardar credita a
+            # espera que veio antes do 429 e encurta a pausa
+            self._reabastecer()
+            self._tokens = min(self._tokens, -segundos * self.taxa)
+
+
+class Metricas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._por_endpoint = {}
+
+    def registrar(self, endpoint, segundos, erro=None, repeticao=False):
+        with self._lock:
+            m = self._por_endpoint.setdefault(
+                endpoint,
+                {
+                    "chamadas": 0,
+                    "erros": 0,
+                    "repeticoes": 0,
+                    "segundos": 0.0,
+                    "histograma": [0] * (len(LIMITES_LATENCIA_MS) + 1),
+                },
+            )
+            m["chamadas"] += 1
+            m["segundos"] += segundos
+            m["erros"] += 1 if erro else 0
+            m["repeticoes"] += 1 if repeticao else 0
+            ms = segundos * 1000
+            faixa = next(
+                (i for i, lim in enumerate(LIMITES_LATENCIA_MS) if ms <= lim),
+                len(LIMITES_LATENCIA_MS),
+            )
+            m["histograma"][faixa] += 1
+
+    def resumo(self):
+        """{endpoint: {chamadas, erros, repeticoes, media_ms, histograma}} (cópia)."""
+        with self._lock:
+            return {
+                ep: {
+                    "chamadas": m["chamadas"],
+                    "erros": m["erros"],
+                    "repeticoes": m["repeticoes"],
+                    "media_ms": round(1000 * m["segundos"] / m["chamadas"], 1),
+                    "histograma": list(m["histograma"]),
+                }
+                for ep, m in self._por_endpoint.items()
+            }
+
+    def zerar(self):
+        with self._lock:
+            self._por_endpoint.clear()
+
+    def imprimir(self):
+        rotulos = [f"<={lim}ms" for lim in LIMITES_LATENCIA_MS] + [f">{LIMITES_LATENCIA_MS[-1]}ms"]
+        for ep, m in sorted(self.resumo().items()):
+            hist = " ".join(f"{r}:{n}" for r, n in zip(rotulos, m["histograma"]) if n)
+            print(
+                f"   {ep}: {m['chamadas']} chamadas, {m['repeticoes']} repetidas, "
+                f"{m['erros']} erros, média {m['media_ms']}ms [{hist}]"
+            )
+
+
+balde = BaldeTokens(NOTION_RPS, NOTION_RAJADA)
+metricas = Metricas()
+
+
+def nome_endpoint(method, path):
+    """'databases/<id>/query' -> 'POST databases/:id/query' (agrupa por rota)."""
+    partes = [":id" if _RE_ID.match(p) else p for p in path.strip("/").split("/")]
+    return f"{method.upper()} {'/'.join(partes)}"
+
+
+def idempotente(method, path):
+    """GETs e a consulta de banco (POST só de leitura) podem ser repetidos sem efeito colateral."""
+    return method.upper() == "GET" or nome_endpoint(method, path) == "POST databases/:id/query"
+
+
+def _espera_retry_after(erro):
+    valor = erro.headers.get("Retry-After") if getattr(erro, "headers", None) else None
+    try:
+        return min(float(valor), ESPERA_MAXIMA) if valor else None
+    except ValueError:
+        return None
+
+
+class ClienteNotion(Client):
+    """
+    notion_client.Client com orçamento compartilhado, novas tentativas e métricas.
+
+    429 e falha de conexão (a requisição nem chegou ao Notion) são repetidos em
+    qualquer método. Timeout, erro de transporte no meio e 5xx só nas chamadas
+    idempotentes: um pages.update/comments.create pode já ter sido aplicado, e
+    repetir duplicaria o comentário/alteração.
+    """
+
+    def request(self, path, method, query=None, body=None, auth=None):
+        endpoint = nome_endpoint(method, path)
+        pode_repetir = idempotente(method, path)
+        for tentativa in range(NOTION_TENTATIVAS):
+            balde.aguardar()
+            inicio = time.perf_counter()
+            try:
+                resposta = super().request(path, method, query, body, auth)
+                metricas.registrar(endpoint, time.perf_counter() - inicio, repeticao=tentativa > 0)
+                return resposta
+            except HTTPResponseError as e:
+                metricas.registrar(endpoint, time.perf_counter() - inicio, e, tentativa > 0)
+                if not (e.status == 429 or (e.status >= 500 and pode_repetir)):
+                    raise
+                if tentativa == NOTION_TENTATIVAS - 1:
+                    raise
+                espera = _espera_retry_after(e) or min(2 ** tentativa, ESPERA_MAXIMA)
+                if e.status == 429:
+                    # A pausa vale para todas as threads; a espera acontece no balde
+                    balde.pausar(espera)
+                    espera = 0.0
+            except (RequestTimeoutError, httpx.TransportError) as e:
+                metricas.registrar(endpoint, time.perf_counter() - inicio, e, tentativa > 0)
+                if not (pode_repetir or isinstance(e, httpx.ConnectError)):
+                    raise
+                if tentativa == NOTION_TENTATIVAS - 1:
+                    raise
+                espera = min(2 ** tentativa, ESPERA_MAXIMA)
+            time.sleep(espera + random.uniform(0, 0.5))
+
+
+_clientes = {}
+_lock = threading.Lock()
+
+
+def obter_cliente(token):
+    """Um ClienteNotion (e pool de conexões HTTP) por token, reaproveitado pelo processo."""
+    with _lock:
+        if token not in _clientes:
+            http = httpx.Client(
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=10)
+            )
+            _clientes[token] = ClienteNotion(
+                auth=token, client=http, timeout_ms=int(NOTION_TIMEOUT * 1000)
+            )
+        return _clientes[token]
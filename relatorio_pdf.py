@@ -0,0 +1,548 @@
+import atexit
+import hashlib
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.dates as mdates
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+from fpdf import FPDF
+from PIL import Image
+
+from armazenamento import chave_area
+
+CORES_STATUS = {
+    "Não Iniciado": "gray",
+    "Em Andamento": "#4da6ff",
+    "Bloqueado": "#ff4d4d",
+    "Concluído": "#00cc66",
+}
+LOGO_PADRAO = "logo.jpg"
+
+# CORES DBV (RGB)
+COR_VERDE_DBV = (32, 53, 47)
+COR_DOURADO = (148, 129, 97)
+COR_CINZA_CLARO = (245, 245, 245)
+COR_VERMELHO_SUAVE = (180, 60, 60)
+COR_AZUL_S2 = (52, 73, 94)
+
+# Imagens enviadas: reamostradas para o tamanho que ocupam na página
+IMAGEM_DPI = 150
+IMAGEM_CACHE_MB = int(os.getenv("IMAGEM_CACHE_MB", "64"))
+GANTT_CACHE_MAX = int(os.getenv("GANTT_CACHE_MAX", "16"))
+# Cronograma quebrado em páginas de tamanho fixo, renderizadas em paralelo
+GANTT_LINHAS_POR_PAGINA = 30
+GANTT_WORKERS = int(os.getenv("GANTT_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) - 1)))))
+
+
+def limpar_texto_pdf(texto):
+    if not isinstance(texto, str):
+        return str(texto)
+    texto = texto.replace("*", "")
+    mapa = {"–": "-", "—": "-", "“": '"', "”": '"', "‘": "'", "’": "'", "…": "..."}
+    for k, v in mapa.items():
+        texto = texto.replace(k, v)
+    return texto.encode("latin-1", "replace").decode("latin-1")
+
+
+# --- CACHE DE IMAGENS (por conteúdo + tamanho na página) ---
+_cache_imagens = OrderedDict()
+_cache_imagens_lock = threading.Lock()
+_cache_imagens_bytes = [0]
+
+
+def _ler_bytes(f):
+    if isinstance(f, (bytes, bytearray)):
+        return bytes(f)
+    if isinstance(f, str):
+        with open(f, "rb") as arq:
+            return arq.read()
+    if hasattr(f, "getvalue"):
+        return f.getvalue()
+    f.seek(0)
+    return f.read()
+
+
+def _mm_para_px(mm):
+    return max(1, int(round(mm / 25.4 * IMAGEM_DPI)))
+
+
+def salvar_imagem_temporaria(f, largura_mm, altura_mm=None):
+    """
+    JPEG temporário da imagem enviada, reduzido ao tamanho que ocupa no PDF
+    (largura_mm x altura_mm a IMAGEM_DPI). O resultado é reaproveitado para o
+    mesmo conteúdo e tamanho; o cache é limitado a IMAGEM_CACHE_MB.
+    """
+    if not f:
+        return None
+    try:
+        dados = _ler_bytes(f)
+    except (OSError, ValueError):
+        return None
+    chave = (hashlib.sha256(dados).hexdigest(), largura_mm, altura_mm)
+    with _cache_imagens_lock:
+        item = _cache_imagens.get(chave)
+        if item and os.path.exists(item[0]):
+            _cache_imagens.move_to_end(chave)
+            return item[0]
+
+    try:
+        img = Image.open(io.BytesIO(dados))
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        if altura_mm:
+            # O PDF desenha em largura_mm x altura_mm (esticando); já entrega nesse formato
+            img = img.resize((_mm_para_px(largura_mm), _mm_para_px(altura_mm)), Image.LANCZOS)
+        else:
+            img.thumbnail((_mm_para_px(largura_mm), 10 ** 5), Image.LANCZOS)
+        fd, caminho = tempfile.mkstemp(suffix=".jpg")
+        with os.fdopen(fd, "wb") as tmp:
+            img.save(tmp, format="JPEG", quality=85, optimize=True)
+    except Exception:
+        return None
+
+    tamanho = os.path.getsize(caminho)
+    with _cache_imagens_lock:
+        antigo = _cache_imagens.pop(chave, None)
+        if antigo:
+            _cache_imagens_bytes[0] -= antigo[1]
+            _remover_arquivo(antigo[0])
+        _cache_imagens[chave] = (caminho, tamanho)
+        _cache_imagens_bytes[0] += tamanho
+        while _cache_imagens_bytes[0] > IMAGEM_CACHE_MB * 1024 * 1024 and len(_cache_imagens) > 1:
+            _, (velho, tam) = _cache_imagens.popitem(last=False)
+            _cache_imagens_bytes[0] -= tam
+            _remover_arquivo(velho)
+    return caminho
+
+
+def limpar_cache_imagens():
+    with _cache_imagens_lock:
+        while _cache_imagens:
+            _, (caminho, _) = _cache_imagens.popitem()
+            _remover_arquivo(caminho)
+        _cache_imagens_bytes[0] = 0
+
+
+def _remover_arquivo(caminho):
+    try:
+        os.remove(caminho)
+    except OSError:
+        pass
+
+
+def preparar_gantt(df_area):
+    """Ordena as tarefas e converte tudo em listas simples (enviáveis a outro processo)."""
+    df = df_area.sort_values(by="Inicio")
+    ini = pd.to_datetime(df["Inicio"], errors="coerce")
+    fim = pd.to_datetime(df["Fim"], errors="coerce")
+    ini, fim = ini.fillna(fim), fim.fillna(ini)
+    validas = ini.notna().to_numpy()
+    df, ini, fim = df[validas], ini[validas], fim[validas]
+
+    s = mdates.date2num(ini.to_numpy())
+    e = mdates.date2num(fim.to_numpy())
+    larg = np.where(e - s == 0, 1, e - s)
+    return {
+        "inicio": s.tolist(),
+        "largura": larg.tolist(),
+        "cores": df["Status"].map(CORES_STATUS).fillna("#4da6ff").tolist(),
+        "rotulos": [
+            f"{limpar_texto_pdf(str(p))[:15]}.. - {limpar_texto_pdf(str(t))[:20]}"
+            for p, t in zip(df["Projeto"], df["Tarefa"])
+        ],
+        "responsaveis": [limpar_texto_pdf(str(r)) for r in df["Responsavel"]],
+    }
+
+
+def desenhar_pagina_gantt(dados, area, eixo_x, pagina, total, caminho):
+    """
+    Desenha uma página do cronograma (uma chamada de barras e uma de rótulos).
+    Todas as páginas usam o mesmo eixo de datas e a mesma altura de linha.
+    """
+    n = len(dados["inicio"])
+    h = GANTT_LINHAS_POR_PAGINA * 0.5 + 1.1
+    fig = Figure(figsize=(12, h))
+    ax = fig.subplots()
+    y = np.arange(n)
+    barras = ax.barh(
+        y,
+        dados["largura"],
+        left=dados["inicio"],
+        height=0.6,
+        color=dados["cores"],
+        alpha=0.8,
+    )
+    ax.bar_label(
+        barras,
+        labels=dados["responsaveis"],
+        label_type="center",
+        color="white",
+        fontsize=7,
+        fontweight="bold",
+    )
+    ax.set_yticks(y)
+    ax.set_yticklabels(dados["rotulos"], fontsize=9)
+    # Primeira tarefa no topo: a leitura segue de uma página para a outra
+    ax.set_ylim(GANTT_LINHAS_POR_PAGINA - 0.5, -0.5)
+    ax.set_xlim(*eixo_x)
+    ax.xaxis_date()
+    ax.xaxis.set_major_formatter(mdates.DateFormatter("%d/%m"))
+    titulo = f"CRONOGRAMA: {limpar_texto_pdf(area).upper()}"
+    if total > 1:
+        titulo += f" ({pagina}/{total})"
+    ax.set_title(titulo, fontsize=14, fontweight="bold", color="#20352f")
+    ax.grid(axis="x", linestyle="--", alpha=0.5)
+    # Margens fixas (rótulos já truncados): evita o desenho extra do tight_layout
+    fig.subplots_adjust(left=0.25, right=0.98, top=1 - 0.6 / h, bottom=0.5 / h)
+    fig.savefig(caminho, dpi=100, pil_kwargs={"quality": 85, "optimize": True})
+    return caminho
+
+
+def _fatiar(dados, inicio, fim):
+    return {k: v[inicio:fim] for k, v in dados.items()}
+
+
+_pool_gantt = None
+_pool_gantt_lock = threading.Lock()
+
+
+def _obter_pool_gantt():
+    # Pool de processos criado sob demanda e reaproveitado entre relatórios.
+    # "spawn" evita fork de um servidor com várias threads (Streamlit).
+    global _pool_gantt
+    with _pool_gantt_lock:
+        if _pool_gantt is None:
+            _pool_gantt = ProcessPoolExecutor(
+                max_workers=GANTT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool_gantt
+
+
+def _encerrar_pool_gantt():
+    global _pool_gantt
+    with _pool_gantt_lock:
+        if _pool_gantt is not None:
+            _pool_gantt.shutdown(wait=False, cancel_futures=True)
+            _pool_gantt = None
+
+
+def desenhar_gantt_paginado(df_area, area, paralelo=True):
+    """Renderiza o cronograma em páginas de GANTT_LINHAS_POR_PAGINA linhas, em ordem."""
+    dados = preparar_gantt(df_area)
+    n = len(dados["inicio"])
+    if n == 0:
+        return []
+    fins = [i + l for i, l in zip(dados["inicio"], dados["largura"])]
+    x0, x1 = min(dados["inicio"] + fins), max(dados["inicio"] + fins)
+    folga = max(1.0, (x1 - x0) * 0.02)
+    eixo_x = (x0 - folga, x1 + folga)
+
+    total = -(-n // GANTT_LINHAS_POR_PAGINA)
+    tarefas = []
+    for pag in range(total):
+        fd, caminho = tempfile.mkstemp(suffix=".jpg")
+        os.close(fd)
+        ini = pag * GANTT_LINHAS_POR_PAGINA
+        fatia = _fatiar(dados, ini, ini + GANTT_LINHAS_POR_PAGINA)
+        tarefas.append((fatia, area, eixo_x, pag + 1, total, caminho))
+
+    if paralelo and total > 1 and GANTT_WORKERS > 1:
+        try:
+            pool = _obter_pool_gantt()
+            futuros = [pool.submit(desenhar_pagina_gantt, *t) for t in tarefas]
+            return [f.result() for f in futuros]
+        except BrokenProcessPool:
+            _encerrar_pool_gantt()
+    return [desenhar_pagina_gantt(*t) for t in tarefas]
+
+
+# --- CACHE DE GANTT (LRU de páginas em arquivos temporários) ---
+_cache_gantt = OrderedDict()
+_cache_gantt_lock = threading.Lock()
+
+
+def limpar_cache_gantt():
+    with _cache_gantt_lock:
+        while _cache_gantt:
+            _, caminhos = _cache_gantt.popitem()
+            for caminho in caminhos:
+                _remover_arquivo(caminho)
+
+
+atexit.register(limpar_cache_gantt)
+atexit.register(_encerrar_pool_gantt)
+atexit.register(limpar_cache_imagens)
+
+
+def gerar_paginas_gantt(df_area, area, projs=None, versao=None, paralelo=True):
+    """
+    Caminhos dos JPEGs (um por página) do cronograma, reaproveitados enquanto
+    (área, projetos, versão dos dados) não mudar. Arquivos despejados do
+    cache são apagados.
+    """
+    if df_area is None or df_area.empty:
+        return []
+    chave = (chave_area(area), tuple(sorted(map(str, projs or []))), versao)
+    with _cache_gantt_lock:
+        caminhos = _cache_gantt.get(chave)
+        if caminhos and all(os.path.exists(c) for c in caminhos):
+            _cache_gantt.move_to_end(chave)
+            return caminhos
+
+    caminhos = desenhar_gantt_paginado(df_area, area, paralelo=paralelo)
+
+    with _cache_gantt_lock:
+        for antigo in _cache_gantt.pop(chave, []):
+            if antigo not in caminhos:
+                _remover_arquivo(antigo)
+        _cache_gantt[chave] = caminhos
+        while len(_cache_gantt) > GANTT_CACHE_MAX:
+            _, velhos = _cache_gantt.popitem(last=False)
+            for velho in velhos:
+                _remover_arquivo(velho)
+    return caminhos
+
+
+# --- PDF ESTILIZADO ---
+class PDF(FPDF):
+    def header(self):
+        if os.path.exists(LOGO_PADRAO):
+            try:
+                self.image(LOGO_PADRAO, 10, 8, 33)
+            except:
+                pass
+        self.set_font("Arial", "B", 15)
+        self.set_text_color(*COR_VERDE_DBV)
+        self.cell(0, 10, "RELATORIO DE STATUS", 0, 1, "R")
+        self.set_draw_color(*COR_DOURADO)
+        self.set_line_width(0.5)
+        self.line(10, 25, 200, 25)
+        self.ln(15)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font("Arial", "I", 8)
+        self.set_text_color(*COR_DOURADO)
+        self.cell(0, 10, f"DBV Capital - Pagina {self.page_no()}", 0, 0, "C")
+
+    def chapter_block(self, title, content, color_header):
+        if not content or len(content) < 3:
+            return
+        self.set_fill_color(*color_header)
+        self.set_text_color(255, 255, 255)
+        self.set_font("Arial", "B", 10)
+        self.cell(0, 7, f"  {title}", 0, 1, "L", True)
+        self.set_fill_color(250, 250, 250)
+        self.set_text_color(0, 0, 0)
+        self.set_font("Arial", "", 10)
+        self.set_draw_color(*color_header)
+        self.set_line_width(0.5)
+
+        lines = content.split("\n")
+        for line in lines:
+            line = line.strip()
+            if not line or line == "**" or line == "*":
+                continue
+            if line.startswith("-") or line.startswith("*"):
+                clean_line = line[1:].strip()
+                texto_formatado = f"  {chr(149)}  {clean_line}"
+            else:
+                texto_formatado = f"  {line}"
+            self.multi_cell(
+                0, 6, limpar_texto_pdf(texto_formatado), border="L", fill=True
+            )
+        self.ln(3)
+
+
+def montar_relatorio(dados, df_area, paginas_gantt=(), progresso=None):
+    """
+    Monta o PDF do relatório semanal de uma área e retorna os bytes.
+
+    `dados` traz os campos do formulário da aba 1 (area, resp, sem, str_s2,
+    vit, ris, dec, dep, up_geral, projetos, infos, up_rot, obs_rot, kpis,
+    imp, dir); imagens podem ser uploads, caminhos ou bytes. `df_area` são
+    as tarefas da área e `paginas_gantt` as imagens do cronograma (ou uma
+    função que as gera). `progresso(etapa, fracao)` é avisado a cada etapa.
+    """
+    if progresso is None:
+        progresso = lambda etapa, fracao: None  # noqa: E731
+    progresso("blocos", 0.0)
+    area = dados.get("area", "")
+    sem = dados.get("sem", "")
+    str_s2 = dados.get("str_s2", "")
+    projetos = dados.get("projetos") or []
+    infos = dados.get("infos") or {}
+    tarefas_por_projeto = dict(tuple(df_area.groupby("Projeto", sort=False)))
+
+    pdf = PDF()
+    pdf.add_page()
+    pdf.set_auto_page_break(True, 20)
+
+    pdf.set_font("Arial", "B", 12)
+    pdf.set_text_color(*COR_VERDE_DBV)
+    pdf.cell(0, 5, f"AREA: {limpar_texto_pdf(str(area).upper())}", ln=True)
+    pdf.set_font("Arial", size=10)
+    pdf.set_text_color(0, 0, 0)
+    pdf.cell(
+        0,
+        5,
+        f"Resp: {limpar_texto_pdf(dados.get('resp', ''))} | Sem: {sem}",
+        ln=True,
+    )
+    pdf.ln(5)
+
+    pdf.chapter_block(
+        "RESUMO EXECUTIVO",
+        limpar_texto_pdf(
+            f"Vitoria: {dados.get('vit', '')}\nRisco: {dados.get('ris', '')}\n"
+            f"Decisao: {dados.get('dec', '')}\nDependencias: {dados.get('dep', '')}"
+        ),
+        COR_VERDE_DBV,
+    )
+
+    if dados.get("up_geral"):
+        p = salvar_imagem_temporaria(dados["up_geral"], 180)
+        if p:
+            if pdf.get_y() > 200:
+                pdf.add_page()
+            pdf.image(p, w=180)
+            pdf.ln(5)
+
+    pdf.set_font("Arial", "B", 11)
+    pdf.set_text_color(*COR_VERDE_DBV)
+    pdf.cell(0, 8, "DETALHAMENTO POR PROJETO", ln=True)
+    pdf.set_draw_color(*COR_DOURADO)
+    pdf.line(pdf.get_x(), pdf.get_y(), 200, pdf.get_y())
+    pdf.ln(3)
+
+    if not projetos:
+        pdf.set_text_color(0, 0, 0)
+        pdf.cell(0, 10, "Nenhum.", ln=True)
+    else:
+        for i, p in enumerate(projetos):
+            progresso("imagens", 0.1 + 0.5 * i / len(projetos))
+            if pdf.get_y() > 220:
+                pdf.add_page()
+            pdf.ln(2)
+
+            pdf.set_font("Arial", "B", 14)
+            pdf.set_text_color(*COR_VERDE_DBV)
+            pdf.cell(0, 8, f"{limpar_texto_pdf(p)}", ln=True)
+            pdf.ln(2)
+
+            dm = infos.get(p, {})
+            ic, ia = dm.get("ic"), dm.get("ia")
+            if ic or ia:
+                if pdf.get_y() > 180:
+                    pdf.add_page()
+                y = pdf.get_y() + 2
+                if ic:
+                    im = salvar_imagem_temporaria(ic, 90, 50)
+                    if im:
+                        pdf.image(im, x=10, y=y, w=90, h=50)
+                if ia:
+                    im = salvar_imagem_temporaria(ia, 90, 50)
+                    if im:
+                        pdf.image(im, x=105, y=y, w=90, h=50)
+                pdf.set_y(y + 55)
+
+            ent, trv, aca, ps2 = map(
+                lambda x: limpar_texto_pdf(dm.get(x, "")),
+                ["ent", "trv", "aca", "plan_s2"],
+            )
+            pdf.chapter_block("ENTREGAS (VISAO DO MOMENTO)", ent, COR_VERDE_DBV)
+            pdf.chapter_block("TRAVAS", trv, COR_VERMELHO_SUAVE)
+            pdf.chapter_block("PROXIMOS PASSOS (S+1)", aca, COR_DOURADO)
+
+            if ps2:
+                pdf.chapter_block(
+                    f"PLANEJAMENTO S+2: {limpar_texto_pdf(p)} ({str_s2})",
+                    ps2,
+                    COR_AZUL_S2,
+                )
+
+            ts = tarefas_por_projeto.get(p)
+            if ts is not None and not ts.empty:
+                pdf.ln(2)
+                pdf.set_font("Arial", "B", 9)
+                pdf.set_text_color(0, 0, 0)
+                pdf.set_fill_color(*COR_CINZA_CLARO)
+                pdf.cell(30, 6, "STATUS", 1, 0, "C", True)
+                pdf.cell(110, 6, "TAREFA", 1, 0, "L", True)
+                pdf.cell(50, 6, "RESPONSAVEL", 1, 1, "L", True)
+                pdf.set_font("Arial", "", 9)
+                for _, r in ts.iterrows():
+                    stt = limpar_texto_pdf(r["Status"])
+                    tn = limpar_texto_pdf(str(r["Tarefa"]))[:65]
+                    rnm = limpar_texto_pdf(str(r["Responsavel"]))[:25]
+                    pdf.set_text_color(0, 0, 0)
+                    if "Concluído" in stt:
+                        pdf.set_text_color(0, 100, 0)
+                    elif "Atrasado" in stt:
+                        pdf.set_text_color(200, 0, 0)
+                    elif "Andamento" in stt:
+                        pdf.set_text_color(0, 0, 200)
+                    pdf.cell(30, 6, stt, 1, 0, "C")
+                    pdf.set_text_color(0, 0, 0)
+                    pdf.cell(110, 6, f" {tn}", 1, 0, "L")
+                    pdf.cell(50, 6, f" {rnm}", 1, 1, "L")
+            pdf.ln(5)
+
+    pdf.add_page()
+    pdf.chapter_block(
+        "KPIs & ROTINA",
+        limpar_texto_pdf(f"Obs: {dados.get('obs_rot', '')}"),
+        COR_VERDE_DBV,
+    )
+    if dados.get("up_rot"):
+        im = salvar_imagem_temporaria(dados["up_rot"], 180)
+        if im:
+            pdf.image(im, w=180)
+            pdf.ln(5)
+
+    pdf.set_font("Arial", size=9)
+    for r in dados.get("kpis") or []:
+        if r.get("KPI"):
+            pdf.set_text_color(*COR_VERDE_DBV)
+            pdf.cell(30, 6, limpar_texto_pdf(f"{r['KPI']}:"), 0)
+            pdf.set_text_color(0, 0, 0)
+            pdf.cell(
+                0,
+                6,
+                limpar_texto_pdf(
+                    f"{r.get('Real')} / {r.get('Meta')} ({r.get('Leitura')})"
+                ),
+                0,
+                1,
+            )
+
+    pdf.ln(5)
+    pdf.chapter_block(
+        "ENCERRAMENTO",
+        limpar_texto_pdf(
+            f"Impacto:\n{dados.get('imp', '')}\n\n"
+            f"Direcionamentos:\n{dados.get('dir', '')}"
+        ),
+        COR_VERDE_DBV,
+    )
+
+    progresso("gantt", 0.7)
+    if callable(paginas_gantt):
+        paginas_gantt = paginas_gantt()
+    for im in paginas_gantt:
+        pdf.add_page()
+        pdf.image(im, x=10, y=10, w=190)
+    progresso("serializacao", 0.9)
+    return pdf.output(dest="S").encode("latin-1", "replace")
@@ -0,0 +1,617 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import openai
+from openai import OpenAI
+
+from armazenamento import chave_area
+from cache_disco import CacheDisco
+
+try:
+    import tiktoken
+
+    _codificador = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _codificador = None
+
+MODELO = "gpt-4o"
+TEMPERATURA = 0.3
+# Resumos simultâneos (vários projetos de uma vez) e resiliência das chamadas
+IA_CONCORRENCIA = int(os.getenv("IA_CONCORRENCIA", "4"))
+IA_TIMEOUT = float(os.getenv("IA_TIMEOUT", "60"))
+IA_TENTATIVAS = 3
+# Tamanho máximo (tokens) dos DADOS de um projeto enviados no prompt
+IA_ORCAMENTO_TOKENS = int(os.getenv("IA_ORCAMENTO_TOKENS", "3000"))
+
+_ERROS_TRANSITORIOS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+# Respostas do modelo em disco, pela impressão digital do prompt
+cache_respostas = CacheDisco(
+    "cache_ia.json",
+    ttl_segundos=int(os.getenv("IA_CACHE_TTL", str(7 * 24 * 3600))),
+    max_entradas=int(os.getenv("IA_CACHE_MAX", "500")),
+)
+tokens_economizados = [0]
+
+# Último resumo de cada projeto + data do comentário mais novo que ele já cobre
+resumos_projetos = CacheDisco(
+    "resumos_projetos.json",
+    max_entradas=int(os.getenv("IA_RESUMOS_MAX", "2000")),
+)
+
+_clientes = {}
+_clientes_lock = threading.Lock()
+
+
+def obter_cliente(api_key):
+    """Um cliente (e pool de conexões HTTP) por chave, reaproveitado entre chamadas."""
+    with _clientes_lock:
+        if api_key not in _clientes:
+            _clientes[api_key] = OpenAI(api_key=api_key, timeout=IA_TIMEOUT, max_retries=0)
+        return _clientes[api_key]
+
+
+# --- FUNÇÃO IA PREDITIVA (PARSING ROBUSTO) ---
+def montar_prompt(texto_comentarios, data_atual_str, data_s2_str):
+    return f"""
+        Atue como um PMO Sênior da DBV. Analise o status, datas e comentários.
+        
+        CONTEXTO:
+        - Hoje (Semana Atual): {data_atual_str}
+        - Semana Futura (S+2 - Daqui a 15 dias): {data_s2_str}
+
+        Gere 4 seções OBRIGATÓRIAS usando EXATAMENTE estas tags:
+        
+        [ENTREGAS]: O que foi concluído/avançado NESTA semana.
+        [TRAVAS]: O que está impedindo o avanço hoje.
+        [ACAO]: O que será feito na semana que vem (S+1).
+        [S2]: O que está planejado para a semana S+2 ({data_s2_str}). Se não houver info explícita, PROJETE o próximo passo lógico.
+
+        REGRAS VISUAIS:
+        - Use APENAS hífens (-) para os itens.
+        - Sem negrito.
+        - Texto limpo e direto.
+        
+        DADOS:
+        {texto_comentarios}
+        """
+
+
+def separar_secoes(r):
+    # Lógica de Extração Robusta (Parsing)
+    # Inicializa variáveis
+    ent = "Não identificado."
+    trv = "Não identificado."
+    aca = "Não identificado."
+    s2 = "Não identificado."
+
+    # Tenta quebrar o texto pelas tags
+    try:
+        if "[ENTREGAS]:" in r:
+            ent = r.split("[ENTREGAS]:")[1].split("[TRAVAS]:")[0].strip()
+
+        if "[TRAVAS]:" in r:
+            temp = r.split("[TRAVAS]:")[1]
+            trv = temp.split("[ACAO]:")[0].strip()
+
+        if "[ACAO]:" in r:
+            temp = r.split("[ACAO]:")[1]
+            # Pega até o S2, se existir
+            if "[S2]:" in temp:
+                aca = temp.split("[S2]:")[0].strip()
+            else:
+                aca = temp.strip()
+
+        if "[S2]:" in r:
+            s2 = r.split("[S2]:")[1].strip()
+
+    except Exception as parse_error:
+        # Fallback simples caso a IA bagunce a formatação
+        s2 = f"Erro no formato da IA: {parse_error}. Texto bruto: {r[-100:]}"
+
+    return ent, trv, aca, s2
+
+
+def _completar(client, prompt):
+    """Chamada ao modelo com nova tentativa (backoff exponencial + jitter)."""
+    for tentativa in range(IA_TENTATIVAS):
+        try:
+            return client.chat.completions.create(
+                model=MODELO,
+                messages=[
+                    {"role": "system", "content": "Você é um assistente de PMO."},
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=TEMPERATURA,
+            )
+        except _ERROS_TRANSITORIOS:
+            if tentativa == IA_TENTATIVAS - 1:
+                raise
+            time.sleep(2 ** tentativa + random.uniform(0, 1))
+
+
+def _completar_stream(client, prompt):
+    """
+    Igual a _completar, mas devolve os pedaços de texto conforme chegam.
+    Só tenta de novo se a falha vier antes do primeiro pedaço. O uso de tokens
+    (último chunk) fica em `uso[0]`.
+    """
+    uso = [None]
+
+    def abrir():
+        for tentativa in range(IA_TENTATIVAS):
+            try:
+                return client.chat.completions.create(
+                    model=MODELO,
+                    messages=[
+                        {"role": "system", "content": "Você é um assistente de PMO."},
+                        {"role": "user", "content": prompt},
+                    ],
+                    temperature=TEMPERATURA,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+            except _ERROS_TRANSITORIOS:
+                if tentativa == IA_TENTATIVAS - 1:
+                    raise
+                time.sleep(2 ** tentativa + random.uniform(0, 1))
+
+    def pedacos():
+        for chunk in abrir():
+            if getattr(chunk, "usage", None):
+                uso[0] = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    return pedacos(), uso
+
+
+SECOES = [("ent", "[ENTREGAS]:"), ("trv", "[TRAVAS]:"), ("aca", "[ACAO]:"), ("s2", "[S2]:")]
+
+
+def secoes_em_stream(pedacos):
+    """
+    Lê a resposta aos pedaços e produz (seção, texto) assim que a tag seguinte
+    aparece — mesmo recorte de separar_secoes. No fim produz as seções que
+    faltarem e ("bruto", resposta completa).
+    """
+    bruto = ""
+    fechadas = 0
+    for pedaco in pedacos:
+        bruto += pedaco
+        while fechadas < len(SECOES) - 1:
+            nome, tag = SECOES[fechadas]
+            proxima = SECOES[fechadas + 1][1]
+            if tag not in bruto:
+                break
+            depois = bruto.split(tag, 1)[1]
+            if proxima not in depois:
+                break
+            yield nome, depois.split(proxima)[0].strip()
+            fechadas += 1
+    finais = separar_secoes(bruto)
+    for (nome, _), texto in list(zip(SECOES, finais))[fechadas:]:
+        yield nome, texto
+    yield "bruto", bruto
+
+
+def impressao_digital(prompt, data_atual_str, data_s2_str):
+    bruto = json.dumps(
+        [MODELO, TEMPERATURA, prompt, data_atual_str, data_s2_str], ensure_ascii=False
+    )
+    return hashlib.sha256(bruto.encode("utf-8")).hexdigest()
+
+
+def _resumir(texto_comentarios, api_key, data_atual_str, data_s2_str, forcar, chamar):
+    """
+    Caminho comum dos resumos (com e sem streaming): prompt, cache de respostas
+    e erros. `chamar(cliente, prompt)` faz a chamada e retorna (texto, tokens).
+    Retorna (4 seções, veio_do_cache).
+    """
+    if not texto_comentarios or len(texto_comentarios) < 10:
+        return ("Sem dados.", "", "", ""), False
+    try:
+        prompt = montar_prompt(texto_comentarios, data_atual_str, data_s2_str)
+        chave = impressao_digital(prompt, data_atual_str, data_s2_str)
+        if not forcar:
+            guardado = cache_respostas.obter(chave)
+            if guardado is not None:
+                tokens_economizados[0] += guardado.get("tokens", 0)
+                return separar_secoes(guardado["texto"]), True
+
+        texto, tokens = chamar(obter_cliente(api_key), prompt)
+        cache_respostas.gravar(chave, {"texto": texto, "tokens": tokens or 0})
+        cache_respostas.salvar()
+        return separar_secoes(texto), False
+    except Exception as e:
+        return (f"Erro OpenAI: {str(e)}", "", "", ""), False
+
+
+def gerar_resumo_ia(
+    texto_comentarios, api_key, data_atual_str, data_s2_str, forcar=False
+):
+    def chamar(client, prompt):
+        response = _completar(client, prompt)
+        uso = getattr(response, "usage", None)
+        return response.choices[0].message.content, getattr(uso, "total_tokens", 0)
+
+    secoes, _ = _resumir(
+        texto_comentarios, api_key, data_atual_str, data_s2_str, forcar, chamar
+    )
+    return secoes
+
+
+def gerar_resumo_ia_stream(
+    texto_comentarios, api_key, data_atual_str, data_s2_str, forcar=False,
+    ao_fechar_secao=None,
+):
+    """
+    Versão em streaming de gerar_resumo_ia: chama `ao_fechar_secao(nome, texto)`
+    ("ent", "trv", "aca", "s2") assim que cada seção termina de chegar.
+    Retorna as mesmas 4 seções (e usa o mesmo cache de respostas).
+    """
+    avisar = ao_fechar_secao or (lambda nome, texto: None)
+
+    def chamar(client, prompt):
+        pedacos, uso = _completar_stream(client, prompt)
+        texto = ""
+        for nome, txt in secoes_em_stream(pedacos):
+            if nome == "bruto":
+                texto = txt
+            else:
+                avisar(nome, txt)
+        return texto, getattr(uso[0], "total_tokens", 0)
+
+    secoes, do_cache = _resumir(
+        texto_comentarios, api_key, data_atual_str, data_s2_str, forcar, chamar
+    )
+    if do_cache:
+        for (nome, _), txt in zip(SECOES, secoes):
+            avisar(nome, txt)
+    return secoes
+
+
+def estatisticas_cache():
+    est = cache_respostas.estatisticas()
+    est["tokens_economizados"] = tokens_economizados[0]
+    return est
+
+
+def contar_tokens(texto):
+    """Tokens do texto (tiktoken se instalado; senão ~4 caracteres por token)."""
+    if _codificador is not None:
+        return len(_codificador.encode(texto))
+    return (len(texto) + 3) // 4
+
+
+_RE_COMENTARIO = re.compile(r"^\((\d{2})/(\d{2})\)\s")
+
+
+def data_comentario(dia, mes, data_ref):
+    """(dd/mm) sem ano: assume o ano que deixa a data mais perto (e não muito depois) da referência."""
+    try:
+        d = date(data_ref.year, int(mes), int(dia))
+    except ValueError:
+        return None
+    if d > data_ref + timedelta(days=31):
+        try:
+            d = d.replace(year=d.year - 1)
+        except ValueError:
+            return None
+    return d
+
+
+def separar_comentarios(obs, data_ref):
+    """Quebra o chat `(dd/mm) [Autor]: texto` em [(data, texto)], em ordem cronológica."""
+    comentarios = []
+    for linha in str(obs or "").split("\n"):
+        m = _RE_COMENTARIO.match(linha)
+        if m or not comentarios:
+            dt = data_comentario(m.group(1), m.group(2), data_ref) if m else None
+            comentarios.append([dt, linha])
+        else:
+            # Continuação de um comentário com várias linhas
+            comentarios[-1][1] += "\n" + linha
+    return [(dt, txt) for dt, txt in comentarios if txt.strip()]
+
+
+def _prioridade_tarefa(r, data_ref, data_limite):
+    """Menor = mais importante: abertas e com prazo perto da janela S+1/S+2 primeiro."""
+    aberta = r["Status"] != "Concluído"
+    fim = r["Fim"] if isinstance(r["Fim"], date) else None
+    na_janela = fim is not None and data_ref - timedelta(days=7) <= fim <= data_limite
+    return (0 if aberta else 1) + (0 if na_janela else 2)
+
+
+def montar_texto_projeto(
+    ts_prev, data_ref=None, data_limite=None, orcamento=None, desde=None
+):
+    """
+    Texto das tarefas do projeto para o prompt, limitado a `orcamento` tokens.
+
+    O cabeçalho de cada tarefa entra sempre (tarefas abertas e com prazo entre a
+    semana atual e `data_limite` primeiro). Os comentários entram do mais recente
+    para o mais antigo, dando preferência às tarefas prioritárias; o histórico que
+    não couber vira uma nota "(+N comentários anteriores omitidos)".
+    Com `desde`, só entram comentários a partir dessa data, do mais antigo para o
+    mais novo (e tarefas concluídas fora da janela só aparecem se tiverem
+    comentário novo).
+    Retorna (texto, tokens).
+    """
+    texto, tokens, _ = _texto_projeto(ts_prev, data_ref, data_limite, orcamento, desde)
+    return texto, tokens
+
+
+def _texto_projeto(ts_prev, data_ref, data_limite, orcamento, desde):
+    """montar_texto_projeto + datas dos comentários que ficaram de fora."""
+    data_ref = data_ref or date.today()
+    data_limite = data_limite or data_ref + timedelta(days=18)
+    orcamento = orcamento or IA_ORCAMENTO_TOKENS
+
+    tarefas = []
+    for ordem, (_, r) in enumerate(ts_prev.iterrows()):
+        cab = f"- {r['Tarefa']} ({r['Status']}) [Data: {r['Fim']}]:"
+        prioridade = _prioridade_tarefa(r, data_ref, data_limite)
+        comentarios = separar_comentarios(r["Observacao"], data_ref)
+        if desde is not None:
+            comentarios = [(dt, c) for dt, c in comentarios if dt and dt >= desde]
+            if not comentarios and prioridade == 3:
+                continue
+        tarefas.append(
+            {
+                "ordem": ordem,
+                "prioridade": prioridade,
+                "cabecalho": cab,
+                "comentarios": comentarios,
+                "incluidos": set(),
+            }
+        )
+    tarefas.sort(key=lambda t: (t["prioridade"], t["ordem"]))
+
+    # Reserva a nota de "omitidos" (de tarefas e de comentários) já no cabeçalho
+    usados = contar_tokens("(+000 tarefas de menor prioridade omitidas)") + 1
+    visiveis = []
+    for t in tarefas:
+        custo = contar_tokens(t["cabecalho"]) + 1
+        if t["comentarios"]:
+            custo += contar_tokens("  (+000 comentários mais novos ficam para o próximo resumo)") + 1
+        if usados + custo > orcamento and visiveis:
+            break
+        usados += custo
+        visiveis.append(t)
+
+    # Candidatos: (prioridade da tarefa, mais recente primeiro). No incremental,
+    # do mais antigo para o mais novo: o que não couber fica depois do que entrou
+    # e o próximo resumo continua dali
+    candidatos = []
+    for ti, t in enumerate(visiveis):
+        for ci, (dt, _) in enumerate(t["comentarios"]):
+            idade = (data_ref - dt).days if dt else 10 ** 4
+            if desde is not None:
+                candidatos.append((-idade, 0, ci, ti, ci))
+            else:
+                candidatos.append((t["prioridade"], idade, -ci, ti, ci))
+    candidatos.sort()
+    for _, _, _, ti, ci in candidatos:
+        custo = contar_tokens(visiveis[ti]["comentarios"][ci][1]) + 1
+        if usados + custo > orcamento:
+            if desde is not None:
+                break
+            continue
+        usados += custo
+        visiveis[ti]["incluidos"].add(ci)
+
+    linhas = []
+    omitidas = [dt for t in tarefas[len(visiveis):] for dt, _ in t["comentarios"]]
+    for t in visiveis:
+        incluidos = sorted(t["incluidos"])
+        omitidas += [dt for ci, (dt, _) in enumerate(t["comentarios"]) if ci not in t["incluidos"]]
+        omitidos = len(t["comentarios"]) - len(incluidos)
+        linhas.append(t["cabecalho"])
+        if omitidos:
+            if desde is not None:
+                linhas.append(f"  (+{omitidos} comentários mais novos ficam para o próximo resumo)")
+            else:
+                linhas.append(f"  (+{omitidos} comentários anteriores omitidos)")
+        linhas += [t["comentarios"][ci][1] for ci in incluidos]
+    if len(visiveis) < len(tarefas):
+        linhas.append(f"(+{len(tarefas) - len(visiveis)} tarefas de menor prioridade omitidas)")
+    texto = "\n".join(linhas) + "\n"
+    return texto, contar_tokens(texto), [dt for dt in omitidas if dt]
+
+
+def _item(tarefa, comentario=None, nota=None, limite=160):
+    texto = f"- {tarefa}"
+    if nota:
+        texto += f" ({nota})"
+    if comentario:
+        linha = _RE_COMENTARIO.sub("", comentario.split("\n")[0]).strip()
+        if len(linha) > limite:
+            linha = linha[: limite - 3].rstrip() + "..."
+        texto += f": {linha}"
+    return texto
+
+
+def _juntar_itens(itens, maximo=8):
+    if not itens:
+        return "- Nada identificado nos dados."
+    if len(itens) > maximo:
+        itens = itens[:maximo] + [f"- (+{len(itens) - maximo} outras)"]
+    return "\n".join(itens)
+
+
+def resumo_extrativo(ts_prev, data_ref=None, data_limite=None):
+    """
+    Rascunho das 4 seções sem IA, só com Status, Fim e as datas (dd/mm) do chat:
+    ENTREGAS = concluídas na semana + tarefas com comentário na semana;
+    TRAVAS = bloqueadas + abertas com prazo vencido;
+    ACAO = abertas com prazo até o fim da S+1;
+    S2 = abertas com início ou prazo entre a S+1 e `data_limite`.
+    """
+    data_ref = data_ref or date.today()
+    fim_semana = data_ref + timedelta(days=6)
+    fim_s1 = data_ref + timedelta(days=13)
+    data_limite = data_limite or data_ref + timedelta(days=18)
+
+    ent, trv, aca, s2 = [], [], [], []
+    for _, r in ts_prev.iterrows():
+        tarefa, status = r["Tarefa"], r["Status"]
+        fim = r["Fim"] if isinstance(r["Fim"], date) else None
+        inicio = r["Inicio"] if isinstance(r["Inicio"], date) else None
+        comentarios = separar_comentarios(r["Observacao"], data_ref)
+        da_semana = [c for dt, c in comentarios if dt and data_ref <= dt <= fim_semana]
+        ultimo = comentarios[-1][1] if comentarios else None
+
+        if status == "Concluído":
+            if (fim and data_ref <= fim <= fim_semana) or da_semana:
+                ent.append(_item(tarefa, da_semana[-1] if da_semana else None, "concluída"))
+            continue
+        if status == "Bloqueado":
+            trv.append(_item(tarefa, ultimo, "bloqueada"))
+            continue
+        if da_semana:
+            ent.append(_item(tarefa, da_semana[-1], "avançou"))
+        if fim and fim < data_ref:
+            trv.append(_item(tarefa, ultimo, f"atrasada, prazo {fim.strftime('%d/%m')}"))
+        elif fim and fim <= fim_s1:
+            aca.append(_item(tarefa, nota=f"prazo {fim.strftime('%d/%m')}"))
+        elif (fim and fim <= data_limite) or (inicio and fim_s1 < inicio <= data_limite):
+            s2.append(_item(tarefa, nota=f"prazo {fim.strftime('%d/%m')}" if fim else None))
+
+    return _juntar_itens(ent), _juntar_itens(trv), _juntar_itens(aca), _juntar_itens(s2)
+
+
+def ultimo_comentario(ts_prev, data_ref=None):
+    """Data do comentário mais recente do projeto (None se nenhum tiver data)."""
+    data_ref = data_ref or date.today()
+    datas = [
+        dt
+        for obs in ts_prev["Observacao"]
+        for dt, _ in separar_comentarios(obs, data_ref)
+        if dt
+    ]
+    return max(datas) if datas else None
+
+
+def texto_secoes(secoes):
+    ent, trv, aca, s2 = secoes
+    return f"[ENTREGAS]: {ent}\n[TRAVAS]: {trv}\n[ACAO]: {aca}\n[S2]: {s2}"
+
+
+def impressao_dados(ts_prev, data_ref=None, data_limite=None, orcamento=None):
+    """Hash do que entra no resumo do projeto (tarefas, comentários, janela e orçamento)."""
+    linhas = sorted(
+        json.dumps([str(r[c]) for c in ("Tarefa", "Status", "Fim", "Observacao")], ensure_ascii=False)
+        for _, r in ts_prev.iterrows()
+    )
+    bruto = json.dumps(
+        [linhas, str(data_ref), str(data_limite), orcamento or IA_ORCAMENTO_TOKENS],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(bruto.encode("utf-8")).hexdigest()
+
+
+def resumo_sem_mudancas(area, projeto, ts_prev, data_ref=None, data_limite=None, orcamento=None):
+    """
+    Seções do último resumo do projeto se os dados não mudaram desde ele (nenhum
+    comentário novo, mesmas tarefas e janela): não há o que pedir à IA. Senão None.
+    """
+    anterior = resumos_projetos.obter(f"{chave_area(area)}|{projeto}")
+    if not anterior or not anterior.get("dados") or anterior["dados"] != impressao_dados(
+        ts_prev, data_ref or date.today(), data_limite, orcamento
+    ):
+        return None
+    return tuple(anterior["secoes"])
+
+
+def montar_texto_incremental(
+    area, projeto, ts_prev, data_ref=None, data_limite=None, orcamento=None,
+    reconstruir=False,
+):
+    """
+    Texto do projeto para o resumo contínuo: se já existe um resumo guardado,
+    manda só ele + os comentários posteriores ao último que ele cobriu; senão
+    (ou com `reconstruir`), manda o histórico todo como em montar_texto_projeto.
+    Retorna (texto, tokens, cobertura) — a cobertura (até que comentário foi
+    enviado e a impressão dos dados) vai para registrar_resumo depois que a IA
+    responder.
+    """
+    data_ref = data_ref or date.today()
+    orcamento = orcamento or IA_ORCAMENTO_TOKENS
+    dados = impressao_dados(ts_prev, data_ref, data_limite, orcamento)
+    anterior = None
+    if not reconstruir:
+        anterior = resumos_projetos.obter(f"{chave_area(area)}|{projeto}")
+    if not anterior or not anterior.get("ate"):
+        texto, tokens, omitidas = _texto_projeto(ts_prev, data_ref, data_limite, orcamento, None)
+        # No histórico completo, o que sobrar de antes desta semana fica só na nota
+        omitidas = [dt for dt in omitidas if dt >= data_ref - timedelta(days=7)]
+        return texto, tokens, _cobertura(ts_prev, data_ref, omitidas, dados)
+
+    # Comentários do mesmo dia do último coberto entram de novo (só há data, sem hora)
+    desde = date.fromisoformat(anterior["ate"])
+    resumo = texto_secoes(anterior["secoes"])
+    novos, _, omitidas = _texto_projeto(
+        ts_prev, data_ref, data_limite,
+        max(orcamento - contar_tokens(resumo), 200), desde,
+    )
+    texto = (
+        f"RESUMO ANTERIOR (comentários até {desde.strftime('%d/%m/%Y')}):\n"
+        f"{resumo}\n\n"
+        f"NOVOS DADOS (comentários desde {desde.strftime('%d/%m/%Y')}; "
+        f"atualize o resumo anterior com eles):\n{novos}"
+    )
+    return texto, contar_tokens(texto), _cobertura(ts_prev, data_ref, omitidas, dados)
+
+
+def _cobertura(ts_prev, data_ref, omitidas, dados):
+    # Comentário que ficou fora do prompt segura o `ate` (entra no próximo resumo)
+    # e impede reaproveitar o resumo só porque os dados não mudaram
+    if omitidas:
+        return {"ate": min(omitidas), "dados": None}
+    return {"ate": ultimo_comentario(ts_prev, data_ref), "dados": dados}
+
+
+def registrar_resumo(area, projeto, secoes, cobertura):
+    """Guarda o resumo gerado como base do próximo resumo incremental do projeto."""
+    if secoes[0].startswith("Erro OpenAI") or secoes[0] == "Sem dados.":
+        return
+    ate = cobertura.get("ate")
+    resumos_projetos.gravar(
+        f"{chave_area(area)}|{projeto}",
+        {
+            "secoes": list(secoes),
+            "ate": ate.isoformat() if ate else None,
+            "dados": cobertura.get("dados"),
+        },
+    )
+    resumos_projetos.salvar()
+
+
+def gerar_resumos_em_lote(textos, api_key, data_atual_str, data_s2_str, forcar=False):
+    """
+    Resume vários projetos de uma vez ({projeto: texto} -> {projeto: seções}),
+    com no máximo IA_CONCORRENCIA chamadas simultâneas e o mesmo cliente.
+    """
+    if not textos:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, IA_CONCORRENCIA)) as pool:
+        futuros = {
+            p: pool.submit(
+                gerar_resumo_ia, txt, api_key, data_atual_str, data_s2_str, forcar
+            )
+            for p, txt in textos.items()
+        }
+        return {p: f.result() for p, f in futuros.items()}
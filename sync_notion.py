@@ -1,7 +1,18 @@
 import pandas as pd
-from notion_client import Client
-from datetime import date, datetime
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta, timezone
+import json
 import os
+import queue
+import tempfile
+import threading
+import time
+from cache_disco import CacheDisco
+import diretorio_usuarios
+import armazenamento
+import controle_sync
+import escopo_sync
+import notion_gateway
 
 # --- CONFIGURAÇÃO ---
 NOTION_TOKEN = os.getenv("NOTION_TOKEN")
@@ -17,54 +28,135 @@ print("ENV CHECK:",
 if not NOTION_TOKEN or not DB_ID_PROJETOS or not DB_ID_TAREFAS:
     raise RuntimeError("Variáveis ausentes: NOTION_TOKEN / NOTION_DB_ID_PROJETOS / NOTION_DB_ID_TAREFAS")
 
-notion = Client(auth=NOTION_TOKEN)
-
-# Cache de usuários
-user_cache = {}
+# Cliente compartilhado: orçamento de requisições, novas tentativas e métricas
+notion = notion_gateway.obter_cliente(NOTION_TOKEN)
+
+# Guarda a marca d'água (último sync bem-sucedido) para o modo incremental
+ESTADO_SYNC_FILE = "sync_estado.json"
+# O last_edited_time do Notion é arredondado ao minuto: relemos uma folga
+MARGEM_SYNC = timedelta(minutes=2)
+# Progresso de um sync em andamento para retomar: cursor etc. (regravado a cada
+# página, pequeno) + linhas já buscadas (só acrescentadas, uma por linha)
+CHECKPOINT_FILE = "sync_checkpoint.json"
+CHECKPOINT_LINHAS_FILE = "sync_checkpoint_linhas.jsonl"
+# O cache de comentários é grande: no meio da varredura, grava no máximo a cada N s
+CHECKPOINT_CACHE_S = float(os.getenv("SYNC_CHECKPOINT_CACHE_S", "30"))
+CHECKPOINT_TTL = timedelta(hours=float(os.getenv("SYNC_CHECKPOINT_TTL_H", "12")))
+
+COLUNAS_TAREFA = [
+    "page_id",
+    "Area",
+    "Projeto",
+    "Tarefa",
+    "Responsavel",
+    "Inicio",
+    "Fim",
+    "Status",
+    "Observacao",
+]
+
+# Só estas propriedades vêm nas consultas (o que montar_linha_tarefa lê)
+PROPRIEDADES_TAREFA = [
+    "Tarefa",
+    "Status",
+    "Responsável",
+    "Observação",
+    "Data Entrega",
+    "Data Inicio",
+    "Projeto",
+    "Área",
+]
+PROPRIEDADES_PROJETO = ["Projeto", "Área"]
+
+# Comentários buscados em paralelo; o ritmo (~3 req/s) fica com o notion_gateway
+COMMENT_WORKERS = int(os.getenv("NOTION_COMMENT_WORKERS", "3"))
+# Gravações (Salvar das abas 2 e 3)
+WRITE_WORKERS = int(os.getenv("NOTION_WRITE_WORKERS", "3"))
+
+# Chat renderizado por página: revalida quando a página muda ou após o TTL
+cache_comentarios = CacheDisco(
+    "cache_comentarios.json",
+    ttl_segundos=int(os.getenv("NOTION_COMMENT_CACHE_TTL", str(24 * 3600))),
+    max_entradas=int(os.getenv("NOTION_COMMENT_CACHE_MAX", "20000")),
+)
 
 
 def get_user_name(user_id):
-    if user_id in user_cache:
-        return user_cache[user_id]
+    # Diretório em disco (carregado em lote no início do sync); API só para IDs novos
+    nome = diretorio_usuarios.nome_usuario(user_id)
+    if nome is not None:
+        return nome
     try:
         user = notion.users.retrieve(user_id)
         name = user.get("name", "Usuário")
-        user_cache[user_id] = name
+        diretorio_usuarios.registrar_usuario(user_id, name)
         return name
-    except:
+    except notion_gateway.ERROS_NOTION:
         return "Alguém"
 
 
+def _buscar_comentarios(page_id):
+    """Versão sem tratamento de erro (usada pelo cache, que não guarda falhas)."""
+    comments = notion.comments.list(block_id=page_id)
+    historico = []
+
+    # Notion retorna do mais antigo para o mais novo
+    for c in comments.get("results", []):
+        # Texto
+        texto_parts = [t.get("plain_text", "") for t in c.get("rich_text", [])]
+        texto_completo = "".join(texto_parts)
+
+        # Autor
+        user_obj = c.get("created_by", {})
+        nome_autor = get_user_name(user_obj.get("id"))
+
+        # Data (ISO 8601 -> DD/MM)
+        raw_date = c.get("created_time")  # ex: 2023-10-27T10:00:00.000Z
+        data_fmt = ""
+        if raw_date:
+            dt = datetime.fromisoformat(raw_date.replace("Z", "+00:00"))
+            data_fmt = dt.strftime("%d/%m")
+
+        if texto_completo:
+            # Formato: (25/10) [Nome]: Comentário
+            historico.append(f"({data_fmt}) [{nome_autor}]: {texto_completo}")
+
+    return "\n".join(historico)
+
+
 def buscar_comentarios_nativos(page_id):
     """Busca o chat com DATA para cronologia"""
     try:
-        comments = notion.comments.list(block_id=page_id)
-        historico = []
-
-        # Notion retorna do mais antigo para o mais novo
-        for c in comments.get("results", []):
-            # Texto
-            texto_parts = [t.get("plain_text", "") for t in c.get("rich_text", [])]
-            texto_completo = "".join(texto_parts)
-
-            # Autor
-            user_obj = c.get("created_by", {})
-            nome_autor = get_user_name(user_obj.get("id"))
-
-            # Data (ISO 8601 -> DD/MM)
-            raw_date = c.get("created_time")  # ex: 2023-10-27T10:00:00.000Z
-            data_fmt = ""
-            if raw_date:
-                dt = datetime.fromisoformat(raw_date.replace("Z", "+00:00"))
-                data_fmt = dt.strftime("%d/%m")
-
-            if texto_completo:
-                # Formato: (25/10) [Nome]: Comentário
-                historico.append(f"({data_fmt}) [{nome_autor}]: {texto_completo}")
-
-        return "\n".join(historico)
-    except:
+        return _buscar_comentarios(page_id)
+    except notion_gateway.ERROS_NOTION:
+        return ""
+
+
+def _buscar_e_guardar_comentarios(pagina):
+    page_id, editado_em = pagina
+    try:
+        chat = _buscar_comentarios(page_id)
+    except notion_gateway.ERROS_NOTION as e:
+        # Já passou pelas novas tentativas do gateway: segue sem o chat desta página
+        print(f"   Comentários de {page_id} indisponíveis: {e}")
         return ""
+    cache_comentarios.gravar(page_id, chat, versao=editado_em)
+    return chat
+
+
+def buscar_comentarios_em_lote(paginas):
+    """
+    Busca o chat de várias páginas (page_id, last_edited_time) na mesma ordem.
+    Usa o cache em disco; só as páginas editadas/expiradas vão à API, em paralelo.
+    """
+    chats = [cache_comentarios.obter(pid, versao=editado) for pid, editado in paginas]
+    faltantes = [i for i, chat in enumerate(chats) if chat is None]
+    if faltantes:
+        with ThreadPoolExecutor(max_workers=max(1, COMMENT_WORKERS)) as pool:
+            buscados = pool.map(_buscar_e_guardar_comentarios, [paginas[i] for i in faltantes])
+            for i, chat in zip(faltantes, buscados):
+                chats[i] = chat
+    return chats
 
 
 def safe_get(page, prop_name):
@@ -89,7 +181,7 @@ def safe_get(page, prop_name):
             return dado["date"] if dado["date"] else None
         elif tipo == "relation":
             return dado["relation"][0]["id"] if dado["relation"] else None
-    except:
+    except (KeyError, IndexError, TypeError):
         return None
     return None
 
@@ -99,136 +191,624 @@ def mapear_projetos():
     todos_projetos = {}
     has_more = True
     next_cursor = None
+    params = {"database_id": DB_ID_PROJETOS}
+    projecao = escopo_sync.projecao(notion, DB_ID_PROJETOS, PROPRIEDADES_PROJETO)
+    if projecao:
+        params["filter_properties"] = projecao
+    # Erros (já após as novas tentativas do gateway) sobem: mapa parcial não serve
     while has_more:
-        try:
-            query = notion.databases.query(
-                database_id=DB_ID_PROJETOS, start_cursor=next_cursor
-            )
-            for page in query.get("results", []):
-                proj_id = page["id"]
-                nome = safe_get(page, "Projeto") or "Sem Nome"
-                area = safe_get(page, "Área") or "Geral"
-                todos_projetos[proj_id] = {"Projeto": nome, "Area": area}
-            has_more = query.get("has_more")
-            next_cursor = query.get("next_cursor")
-        except:
-            break
+        query = notion.databases.query(**params, start_cursor=next_cursor)
+        for page in query.get("results", []):
+            proj_id = page["id"]
+            nome = safe_get(page, "Projeto") or "Sem Nome"
+            area = safe_get(page, "Área") or "Geral"
+            todos_projetos[proj_id] = {"Projeto": nome, "Area": area}
+        has_more = query.get("has_more")
+        next_cursor = query.get("next_cursor")
     return todos_projetos
 
 
-def buscar_tarefas(mapa_projetos):
+def montar_linha_tarefa(page, chat_nativo, mapa_projetos):
+    """Página do banco de Tarefas (+ chat já renderizado) -> linha do dataset."""
+    page_id = page["id"]
+    tarefa = safe_get(page, "Tarefa") or "Sem Nome"
+    status = safe_get(page, "Status") or "Não Iniciado"
+    resp = safe_get(page, "Responsável") or "Time"
+
+    # --- LÓGICA DE OBSERVAÇÃO ---
+    obs_coluna = safe_get(page, "Observação") or ""
+
+    # Junta tudo, dando preferência ao chat cronológico
+    obs_final = chat_nativo if chat_nativo else obs_coluna
+
+    # Datas
+    obj_ent = safe_get(page, "Data Entrega")
+    obj_ini = safe_get(page, "Data Inicio")
+    inicio = (
+        obj_ini.get("start")
+        if obj_ini
+        else (obj_ent.get("start") if obj_ent else None)
+    )
+    fim = obj_ent.get("start") if obj_ent else inicio
+
+    # Projeto
+    pid = safe_get(page, "Projeto")
+    if pid and pid in mapa_projetos:
+        nm_proj, nm_area = (
+            mapa_projetos[pid]["Projeto"],
+            mapa_projetos[pid]["Area"],
+        )
+    else:
+        nm_proj, nm_area = "Avulso", safe_get(page, "Área") or "Geral"
+
+    # Status Normalizado
+    st_l = str(status).lower()
+    st_f = (
+        "Concluído"
+        if "conclu" in st_l or "done" in st_l
+        else (
+            "Em Andamento"
+            if "andamento" in st_l or "aprov" in st_l
+            else (
+                "Bloqueado"
+                if "cancel" in st_l or "stand" in st_l
+                else "Não Iniciado"
+            )
+        )
+    )
+
+    return {
+        "page_id": page_id,
+        "Area": nm_area,
+        "Projeto": nm_proj,
+        "Tarefa": tarefa,
+        "Responsavel": resp,
+        "Inicio": inicio,
+        "Fim": fim,
+        "Status": st_f,
+        "Observacao": obs_final,
+    }
+
+
+# Páginas de 100 tarefas em trânsito entre as etapas do pipeline
+FILA_PIPELINE = int(os.getenv("SYNC_FILA_PIPELINE", "2"))
+_FIM = object()
+
+
+class _Etapa:
+    """Tempo ocupado (trabalhando) e em espera (fila vazia/cheia) de uma etapa."""
+
+    def __init__(self, nome):
+        self.nome = nome
+        self.ocupado = 0.0
+        self.espera = 0.0
+
+    def tirar(self, fila):
+        t0 = time.perf_counter()
+        item = fila.get()
+        self.espera += time.perf_counter() - t0
+        return item
+
+    def por(self, fila, item):
+        t0 = time.perf_counter()
+        fila.put(item)
+        self.espera += time.perf_counter() - t0
+
+    def __str__(self):
+        return f"{self.nome}: {self.ocupado:.1f}s ocupada / {self.espera:.1f}s esperando"
+
+
+def _resolver(valor):
+    return valor.result() if isinstance(valor, Future) else valor
+
+
+def buscar_tarefas(mapa_projetos, editadas_desde=None, checkpoint=None, usuarios=None):
+    """
+    Varre o banco de Tarefas. Com `editadas_desde` (ISO 8601) traz só o delta.
+    Com `checkpoint`, continua do cursor/linhas guardados nele e o atualiza a
+    cada página concluída (o cache de comentários, a cada CHECKPOINT_CACHE_S).
+
+    Roda em pipeline, com filas limitadas (FILA_PIPELINE) entre as etapas:
+    consulta (databases.query, cursor a cursor) -> comentários/usuários ->
+    transformação (nesta thread, em ordem, que também grava o checkpoint).
+    `mapa_projetos` e `usuarios` podem ser Futures: a consulta começa sem
+    esperar por eles.
+    """
     print("2. Buscando Tarefas e Chat Cronológico...")
     lista_final = []
     has_more = True
     next_cursor = None
-
-    while has_more:
+    if checkpoint is not None:
+        lista_final = checkpoint["linhas"]
+        next_cursor = checkpoint["cursor"]
+        has_more = not checkpoint["terminado"]
+        if checkpoint["paginas"]:
+            print(f"   Retomando da página {checkpoint['paginas'] + 1} ({len(lista_final)} tarefas já buscadas)")
+    delta = None
+    if editadas_desde:
+        delta = {
+            "timestamp": "last_edited_time",
+            "last_edited_time": {"on_or_after": editadas_desde},
+        }
+    base = {"database_id": DB_ID_TAREFAS}
+    filtro = escopo_sync.combinar(filtro_escopo(), delta)
+    if filtro:
+        base["filter"] = filtro
+    projecao = escopo_sync.projecao(notion, DB_ID_TAREFAS, PROPRIEDADES_TAREFA)
+    if projecao:
+        base["filter_properties"] = projecao
+
+    consulta, comentarios, transformacao = (
+        _Etapa("consulta"), _Etapa("comentários"), _Etapa("transformação")
+    )
+    paginas_q = queue.Queue(maxsize=max(1, FILA_PIPELINE))
+    chats_q = queue.Queue(maxsize=max(1, FILA_PIPELINE))
+    parar = threading.Event()
+    erros = []
+
+    # Erros sobem (nos dois modos): varredura truncada não pode substituir o
+    # dataset nem avançar a marca d'água. Falha na consulta só encerra o fluxo
+    # (as páginas já buscadas ainda entram no checkpoint); falha mais adiante
+    # liga `parar` para as etapas anteriores. Cada etapa sempre esvazia a fila
+    # de entrada até o _FIM, para ninguém ficar preso numa fila cheia.
+    def etapa_consulta(cursor, mais):
         try:
-            query = notion.databases.query(
-                database_id=DB_ID_TAREFAS, start_cursor=next_cursor
-            )
-            for page in query.get("results", []):
-                page_id = page["id"]
-                tarefa = safe_get(page, "Tarefa") or "Sem Nome"
-                status = safe_get(page, "Status") or "Não Iniciado"
-                resp = safe_get(page, "Responsável") or "Time"
-
-                # --- LÓGICA DE OBSERVAÇÃO ---
-                obs_coluna = safe_get(page, "Observação") or ""
-                chat_nativo = buscar_comentarios_nativos(page_id)
-
-                # Junta tudo, dando preferência ao chat cronológico
-                obs_final = chat_nativo if chat_nativo else obs_coluna
-
-                # Datas
-                obj_ent = safe_get(page, "Data Entrega")
-                obj_ini = safe_get(page, "Data Inicio")
-                inicio = (
-                    obj_ini.get("start")
-                    if obj_ini
-                    else (obj_ent.get("start") if obj_ent else None)
-                )
-                fim = obj_ent.get("start") if obj_ent else inicio
-
-                # Projeto
-                pid = safe_get(page, "Projeto")
-                if pid and pid in mapa_projetos:
-                    nm_proj, nm_area = (
-                        mapa_projetos[pid]["Projeto"],
-                        mapa_projetos[pid]["Area"],
-                    )
-                else:
-                    nm_proj, nm_area = "Avulso", safe_get(page, "Área") or "Geral"
-
-                # Status Normalizado
-                st_l = str(status).lower()
-                st_f = (
-                    "Concluído"
-                    if "conclu" in st_l or "done" in st_l
-                    else (
-                        "Em Andamento"
-                        if "andamento" in st_l or "aprov" in st_l
-                        else (
-                            "Bloqueado"
-                            if "cancel" in st_l or "stand" in st_l
-                            else "Não Iniciado"
-                        )
-                    )
-                )
-
-                lista_final.append(
-                    {
-                        "page_id": page_id,
-                        "Area": nm_area,
-                        "Projeto": nm_proj,
-                        "Tarefa": tarefa,
-                        "Responsavel": resp,
-                        "Inicio": inicio,
-                        "Fim": fim,
-                        "Status": st_f,
-                        "Observacao": obs_final,
-                    }
+            while mais and not parar.is_set():
+                t0 = time.perf_counter()
+                query = notion.databases.query(**base, start_cursor=cursor)
+                mais = query.get("has_more")
+                cursor = query.get("next_cursor")
+                consulta.ocupado += time.perf_counter() - t0
+                consulta.por(paginas_q, (query.get("results", []), cursor, mais))
+        except BaseException as e:
+            erros.append(e)
+        finally:
+            consulta.por(paginas_q, _FIM)
+
+    def etapa_comentarios():
+        t0 = time.perf_counter()
+        try:
+            _resolver(usuarios)
+        except notion_gateway.ERROS_NOTION as e:
+            print(f"   Diretório de usuários indisponível: {e}")
+        except BaseException as e:
+            erros.append(e)
+            parar.set()
+        comentarios.espera += time.perf_counter() - t0
+        while True:
+            item = comentarios.tirar(paginas_q)
+            if item is _FIM:
+                break
+            if parar.is_set():
+                continue
+            results, cursor, mais = item
+            try:
+                t0 = time.perf_counter()
+                chats = buscar_comentarios_em_lote(
+                    [(p["id"], p.get("last_edited_time")) for p in results]
                 )
-            has_more = query.get("has_more")
-            next_cursor = query.get("next_cursor")
-        except:
+                comentarios.ocupado += time.perf_counter() - t0
+            except BaseException as e:
+                erros.append(e)
+                parar.set()
+                continue
+            comentarios.por(chats_q, (results, chats, cursor, mais))
+        comentarios.por(chats_q, _FIM)
+
+    threads = [
+        threading.Thread(target=etapa_consulta, args=(next_cursor, has_more), daemon=True),
+        threading.Thread(target=etapa_comentarios, daemon=True),
+    ]
+    for t in threads:
+        t.start()
+
+    mapa = None
+    falhou = False
+    cache_salvo = time.monotonic()
+    while True:
+        item = transformacao.tirar(chats_q)
+        if item is _FIM:
             break
+        if falhou:
+            continue
+        results, chats, cursor, mais = item
+        try:
+            if mapa is None:
+                t0 = time.perf_counter()
+                mapa = _resolver(mapa_projetos)
+                transformacao.espera += time.perf_counter() - t0
+                if checkpoint is not None:
+                    checkpoint["mapa"] = mapa
+            t0 = time.perf_counter()
+            novas = [montar_linha_tarefa(page, chat, mapa) for page, chat in zip(results, chats)]
+            lista_final.extend(novas)
+            if checkpoint is not None:
+                checkpoint.update(
+                    cursor=cursor,
+                    linhas=lista_final,
+                    paginas=checkpoint["paginas"] + 1,
+                    terminado=not mais,
+                )
+                salvar_checkpoint(checkpoint, novas)
+                if time.monotonic() - cache_salvo >= CHECKPOINT_CACHE_S:
+                    cache_comentarios.salvar()
+                    cache_salvo = time.monotonic()
+            transformacao.ocupado += time.perf_counter() - t0
+        except BaseException as e:
+            erros.append(e)
+            falhou = True
+            parar.set()
+    for t in threads:
+        t.join()
+    print(f"   Etapas — {consulta}; {comentarios}; {transformacao}")
+    if erros:
+        raise erros[0]
     return lista_final
 
 
-def atualizar_tarefa_notion(page_id, coluna, novo_valor):
-    props = {}
+def _eh_concluido(status):
+    st_l = str(status).lower()
+    return "conclu" in st_l or "done" in st_l
+
+
+def filtro_escopo():
+    """Filtro do SYNC_ESCOPO no banco de Tarefas (None = banco inteiro)."""
+    return escopo_sync.filtro(
+        notion, DB_ID_TAREFAS, "Status", _eh_concluido, ["Data Entrega", "Data Inicio"]
+    )
+
+
+def listar_ids_tarefas():
+    """IDs das tarefas vivas dentro do escopo (só o título vem na resposta)."""
+    ids = set()
+    has_more = True
+    next_cursor = None
+    params = {"database_id": DB_ID_TAREFAS, "filter_properties": ["title"]}
+    filtro = filtro_escopo()
+    if filtro:
+        params["filter"] = filtro
+    while has_more:
+        query = notion.databases.query(**params, start_cursor=next_cursor)
+        for page in query.get("results", []):
+            if not page.get("archived") and not page.get("in_trash"):
+                ids.add(page["id"])
+        has_more = query.get("has_more")
+        next_cursor = query.get("next_cursor")
+    return ids
+
+
+def _preencher_datas(df):
+    hj = date.today().isoformat()
+    df["Inicio"] = df["Inicio"].fillna(hj)
+    df["Fim"] = df["Fim"].fillna(hj)
+    return df
+
+
+def carregar_estado_sync():
+    if not os.path.exists(ESTADO_SYNC_FILE):
+        return {}
+    try:
+        with open(ESTADO_SYNC_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _gravar_json_atomico(caminho, dados, **kwargs):
+    """Grava num temporário e troca com os.replace: o arquivo nunca fica pela metade."""
+    pasta = os.path.dirname(os.path.abspath(caminho))
+    fd, tmp = tempfile.mkstemp(dir=pasta, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(dados, f, **kwargs)
+        os.replace(tmp, caminho)
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def salvar_estado_sync(estado):
+    _gravar_json_atomico(ESTADO_SYNC_FILE, estado, indent=2)
+
+
+def novo_checkpoint(modo, desde, inicio_sync):
+    return {
+        "modo": modo,
+        "desde": desde,
+        "inicio_sync": inicio_sync.isoformat(),
+        "mapa": None,
+        "cursor": None,
+        "paginas": 0,
+        "terminado": False,
+        "linhas": [],
+    }
+
+
+def carregar_checkpoint(modo, desde):
+    """Checkpoint de um sync interrompido do mesmo tipo (e mesma marca d'água), se recente."""
+    if not os.path.exists(CHECKPOINT_FILE):
+        return None
+    try:
+        with open(CHECKPOINT_FILE, encoding="utf-8") as f:
+            cp = json.load(f)
+        iniciado = datetime.fromisoformat(cp["inicio_sync"])
+        tamanho = cp.pop("linhas_bytes")
+        if cp.get("modo") != modo or cp.get("desde") != desde:
+            return None
+        if datetime.now(timezone.utc) - iniciado > CHECKPOINT_TTL:
+            return None
+        # Só vale o que o cabeçalho confirmou; o resto (queda no meio da página) sai
+        with open(CHECKPOINT_LINHAS_FILE, "r+b") as f:
+            bruto = f.read(tamanho)
+            f.truncate(tamanho)
+        if len(bruto) != tamanho:
+            return None
+        cp["linhas"] = [json.loads(linha) for linha in bruto.decode("utf-8").splitlines()]
+    except (OSError, ValueError, KeyError):
+        return None
+    return cp
+
+
+def salvar_checkpoint(cp, novas=()):
+    """
+    Acrescenta `novas` ao arquivo de linhas e regrava o cabeçalho (cursor,
+    páginas...) com o tamanho confirmado: custo por página, não pelo total.
+    """
+    # Primeira página de um checkpoint novo: descarta linhas de um anterior
+    with open(CHECKPOINT_LINHAS_FILE, "ab" if cp["paginas"] > 1 else "wb") as f:
+        for linha in novas:
+            f.write((json.dumps(linha, ensure_ascii=False) + "\n").encode("utf-8"))
+        tamanho = f.tell()
+    cabecalho = {k: v for k, v in cp.items() if k != "linhas"}
+    cabecalho["linhas_bytes"] = tamanho
+    _gravar_json_atomico(CHECKPOINT_FILE, cabecalho, ensure_ascii=False)
+
+
+def apagar_checkpoint():
+    for caminho in (CHECKPOINT_FILE, CHECKPOINT_LINHAS_FILE):
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+
+STATUS_NOTION = {
+    "Concluído": "Concluída",
+    "Em Andamento": "Em andamento",
+    "Não Iniciado": "Não iniciado",
+    "Bloqueado": "Stand By",
+}
+
+
+def propriedade_notion(coluna, novo_valor):
+    """Coluna do dataset -> (propriedade do Notion, valor no formato da API), ou None."""
     if coluna == "Observacao":
-        props["Observação"] = {"rich_text": [{"text": {"content": str(novo_valor)}}]}
-    elif coluna == "Status":
-        mapa = {
-            "Concluído": "Concluída",
-            "Em Andamento": "Em andamento",
-            "Não Iniciado": "Não iniciado",
-            "Bloqueado": "Stand By",
-        }
-        props["Status"] = {"select": {"name": mapa.get(novo_valor, novo_valor)}}
+        return "Observação", {"rich_text": [{"text": {"content": str(novo_valor)}}]}
+    if coluna == "Status":
+        return "Status", {"select": {"name": STATUS_NOTION.get(novo_valor, novo_valor)}}
+    if coluna == "Tarefa":
+        return "Tarefa", {"title": [{"text": {"content": str(novo_valor)}}]}
+    return None
 
-    if props:
+
+def atualizar_tarefa_notion(page_id, coluna, novo_valor):
+    prop = propriedade_notion(coluna, novo_valor)
+    if prop:
         try:
-            notion.pages.update(page_id=page_id, properties=props)
+            notion.pages.update(page_id=page_id, properties=dict([prop]))
             return True, "Ok"
-        except Exception as e:
+        except notion_gateway.ERROS_NOTION as e:
             return False, str(e)
     return False, "Campo inv"
 
 
-def rodar_sincronizacao():
+def diferencas(original, editado, colunas=("Status", "Observacao", "Tarefa")):
+    """
+    Compara o DataFrame editado com o original (join por page_id, sem laço por
+    linha) e retorna {page_id: {coluna: novo_valor}} só com o que mudou.
+    Linhas novas (sem page_id conhecido) são ignoradas.
+    """
+    colunas = [c for c in colunas if c in original.columns and c in editado.columns]
+    base = original.dropna(subset=["page_id"]).drop_duplicates("page_id").set_index("page_id")
+    novo = editado.dropna(subset=["page_id"]).drop_duplicates("page_id").set_index("page_id")
+    novo = novo.loc[novo.index.isin(base.index), colunas].astype(object).fillna("")
+    base = base.loc[novo.index, colunas].astype(object).fillna("")
+    mudou = (novo != base).stack()
+    alteracoes = {}
+    for pid, coluna in mudou[mudou].index:
+        alteracoes.setdefault(pid, {})[coluna] = novo.at[pid, coluna]
+    return alteracoes
+
+
+def _atualizar_pagina(page_id, campos):
+    props = dict(filter(None, (propriedade_notion(c, v) for c, v in campos.items())))
+    if not props:
+        return False, "Campo inv"
+    try:
+        notion.pages.update(page_id=page_id, properties=props)
+        return True, "Ok"
+    except notion_gateway.ERROS_NOTION as e:
+        return False, str(e)
+
+
+def atualizar_tarefas_em_lote(alteracoes, progresso=None):
+    """
+    Grava {page_id: {coluna: valor}} no Notion com um único pages.update por
+    página, em paralelo (WRITE_WORKERS) e no ritmo compartilhado.
+    `progresso(fração)` é chamado na thread de quem chamou.
+    Retorna [{"page_id", "campos", "ok", "msg"}] na ordem de `alteracoes`.
+    """
+    resultados = {}
+    if alteracoes:
+        with ThreadPoolExecutor(max_workers=max(1, WRITE_WORKERS)) as pool:
+            futuros = {
+                pool.submit(_atualizar_pagina, pid, campos): pid
+                for pid, campos in alteracoes.items()
+            }
+            for feitos, fut in enumerate(as_completed(futuros), start=1):
+                resultados[futuros[fut]] = fut.result()
+                if progresso:
+                    progresso(feitos / len(futuros))
+    return [
+        {"page_id": pid, "campos": list(campos), "ok": resultados[pid][0], "msg": resultados[pid][1]}
+        for pid, campos in alteracoes.items()
+    ]
+
+
+def verificar_tarefas(page_ids):
+    """Relê só as páginas pedidas (propriedades + chat) e devolve as linhas do dataset."""
+    with ThreadPoolExecutor(max_workers=max(1, WRITE_WORKERS)) as pool:
+        paginas = list(pool.map(lambda pid: notion.pages.retrieve(page_id=pid), page_ids))
+    chats = buscar_comentarios_em_lote([(p["id"], p.get("last_edited_time")) for p in paginas])
+    return [montar_linha_tarefa(p, chat, {}) for p, chat in zip(paginas, chats)]
+
+
+def salvar_alteracoes(alteracoes, progresso=None, verificar=True):
+    """
+    Caminho de gravação das abas 2 e 3: grava no Notion em lote, aplica no
+    dataset local o que o Notion confirmou e (com `verificar`) relê só as
+    páginas tocadas — sem a varredura completa de rodar_sincronizacao.
+    Retorna os resultados por página de atualizar_tarefas_em_lote; as gravadas
+    no Notion ganham "local": False (e o erro em "msg") se o dataset local não
+    pôde ser atualizado.
+    """
+    resultados = atualizar_tarefas_em_lote(alteracoes, progresso)
+    confirmadas = [r["page_id"] for r in resultados if r["ok"]]
+    if not confirmadas:
+        return resultados
     try:
-        mapa = mapear_projetos()
-        dados = buscar_tarefas(mapa)
-        if not dados:
-            return False, "0 tarefas"
-        df = pd.DataFrame(dados)
-        hj = date.today()
-        df["Inicio"] = df["Inicio"].fillna(hj)
-        df["Fim"] = df["Fim"].fillna(hj)
-        df.to_csv("tarefas_dbv.csv", index=False)
-        return True, f"{len(df)} tarefas atualizadas."
+        loja = armazenamento.obter_armazenamento()
+        df = loja.ler(ids=confirmadas).set_index("page_id")
+        for pid in df.index:
+            for coluna, valor in alteracoes[pid].items():
+                df.at[pid, coluna] = valor
+            if "Status" in alteracoes[pid]:
+                status = alteracoes[pid]["Status"]
+                df.at[pid, "Status_Original"] = STATUS_NOTION.get(status, status)
+
+        if verificar:
+            try:
+                for linha in verificar_tarefas(list(df.index)):
+                    pid = linha.pop("page_id")
+                    # Área/Projeto não mudam ao salvar: ficam os do dataset (sem remapear projetos)
+                    linha.pop("Area"), linha.pop("Projeto")
+                    for coluna, valor in linha.items():
+                        df.at[pid, coluna] = valor
+            except notion_gateway.ERROS_NOTION as e:
+                print(f"   Verificação das páginas salvas falhou: {e}")
+            finally:
+                cache_comentarios.salvar()
+
+        loja.aplicar_delta(_preencher_datas(df.reset_index()))
+    except armazenamento.ERROS_ARMAZENAMENTO as e:
+        print(f"   Falha ao atualizar o dataset local: {e}")
+        for r in resultados:
+            if r["ok"]:
+                r.update(local=False, msg=f"Salvo no Notion, mas o dataset local falhou: {e}")
+        return resultados
+    for r in resultados:
+        if r["ok"]:
+            r["local"] = True
+    return resultados
+
+
+def rodar_sincronizacao(completo=False):
+    """
+    Sincroniza o banco de Tarefas com o armazenamento local.
+
+    Por padrão é incremental: só pede ao Notion as páginas editadas desde o
+    último sync bem-sucedido e as mescla por page_id. Com `completo=True`
+    (ou sem marca d'água / dataset local) faz a varredura inteira.
+    O progresso fica em CHECKPOINT_FILE: se a execução cair no meio, a próxima
+    do mesmo tipo retoma do último cursor. O dataset só é publicado no fim
+    (transação no SQLite, rename atômico no CSV), o que incrementa a versão.
+
+    Um sync por vez no processo: quem pede enquanto outro roda recebe o
+    resultado dele em vez de começar outra varredura. Um pedido completo que
+    encontra um incremental rodando espera por ele e depois roda o completo.
+    """
+    while True:
+        (completo_dono, (ok, msg)), juntou = controle_sync.executar_unico(
+            "tarefas", _sincronizar_marcado, completo
+        )
+        if not (juntou and completo and not completo_dono):
+            break
+    if juntou:
+        msg += " (sync já estava em andamento)"
+    return ok, msg
+
+
+def _sincronizar_marcado(completo):
+    # Quem se junta precisa saber se a execução que esperou era completa
+    return completo, _sincronizar(completo)
+
+
+def _sincronizar(completo):
+    hits_antes, misses_antes = cache_comentarios.hits, cache_comentarios.misses
+    checkpoint = None
+    try:
+        inicio_sync = datetime.now(timezone.utc)
+        estado = carregar_estado_sync()
+        marca = estado.get("ultimo_sync")
+        escopo = escopo_sync.descricao()
+        loja = armazenamento.obter_armazenamento()
+        # Escopo diferente do último sync: o delta não traria as páginas que entraram
+        incremental = (
+            not completo and marca and loja.existe() and estado.get("escopo", "tudo") == escopo
+        )
+        modo = f"{'incremental' if incremental else 'completo'}/{escopo}"
+        desde = (datetime.fromisoformat(marca) - MARGEM_SYNC).isoformat() if incremental else None
+
+        checkpoint = carregar_checkpoint(modo, desde)
+        if checkpoint:
+            # A marca d'água continua sendo o início da execução original
+            inicio_sync = datetime.fromisoformat(checkpoint["inicio_sync"])
+        else:
+            checkpoint = novo_checkpoint(modo, desde, inicio_sync)
+
+        # Projetos e diretório de usuários carregam junto com as primeiras páginas
+        paralelo = ThreadPoolExecutor(max_workers=2)
+        usuarios = paralelo.submit(diretorio_usuarios.carregar_usuarios, notion)
+        mapa = checkpoint["mapa"]
+        if mapa is None:
+            mapa = paralelo.submit(mapear_projetos)
+        paralelo.shutdown(wait=False)
+        if incremental:
+            dados = buscar_tarefas(
+                mapa, editadas_desde=desde, checkpoint=checkpoint, usuarios=usuarios
+            )
+            ids_ativos = listar_ids_tarefas()
+            if not ids_ativos:
+                apagar_checkpoint()
+                return False, "0 tarefas"
+            df_delta = _preencher_datas(pd.DataFrame(dados, columns=COLUNAS_TAREFA))
+            removidas = loja.listar_ids() - ids_ativos
+            loja.aplicar_delta(df_delta, removidas)
+            total = loja.contar()
+        else:
+            dados = buscar_tarefas(mapa, checkpoint=checkpoint, usuarios=usuarios)
+            if not dados:
+                apagar_checkpoint()
+                return False, "0 tarefas"
+            df = _preencher_datas(pd.DataFrame(dados))
+            loja.substituir(df)
+            total = len(df)
+        salvar_estado_sync({"ultimo_sync": inicio_sync.isoformat(), "escopo": escopo})
+        apagar_checkpoint()
+        hits = cache_comentarios.hits - hits_antes
+        misses = cache_comentarios.misses - misses_antes
+        print(f"   Cache de comentários: {hits} hits / {misses} misses")
+        print("   Chamadas ao Notion (processo):")
+        notion_gateway.metricas.imprimir()
+        if incremental:
+            return True, f"{len(dados)} tarefas alteradas ({total} no total)."
+        return True, f"{total} tarefas atualizadas ({hits} chats do cache)."
     except Exception as e:
+        if checkpoint and checkpoint["linhas"]:
+            return False, (
+                f"{e} (progresso salvo: {len(checkpoint['linhas'])} tarefas; "
+                "o próximo sync continua daí)"
+            )
         return False, str(e)
+    finally:
+        cache_comentarios.salvar()
+        diretorio_usuarios.diretorio.salvar()
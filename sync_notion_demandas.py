@@ -1,7 +1,13 @@
 import pandas as pd
-from notion_client import Client
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date
 import os
+from cache_disco import CacheDisco
+import diretorio_usuarios
+import armazenamento
+import controle_sync
+import escopo_sync
+import notion_gateway
 
 # --- CONFIGURAÇÕES ---
 NOTION_TOKEN = os.getenv("NOTION_TOKEN")
@@ -10,58 +16,109 @@ DB_ID_DEMANDAS = os.getenv("NOTION_DB_ID_DEMANDAS")
 if not NOTION_TOKEN or not DB_ID_DEMANDAS:
     raise RuntimeError("Variáveis ausentes: NOTION_TOKEN / NOTION_DB_ID_DEMANDAS")
 
-# Inicializa o cliente
-notion = Client(auth=NOTION_TOKEN)
+# Inicializa o cliente (compartilhado: orçamento de requisições, novas tentativas e métricas)
+notion = notion_gateway.obter_cliente(NOTION_TOKEN)
 
-# Cache para não ficar consultando a API de usuários toda hora
-user_cache = {}
+# Nomes que o safe_get procura (a consulta só traz estas propriedades)
+PROPRIEDADES_DEMANDA = [
+    "Tarefa", "Name", "Nome",
+    "Status",
+    "Responsável", "Assignee", "Pessoa",
+    "Área", "Team",
+    "Projeto", "Project",
+    "Data", "Prazo", "Timeline",
+    "Observação",
+]
+
+# Comentários buscados em paralelo; o ritmo (~3 req/s) fica com o notion_gateway
+COMMENT_WORKERS = int(os.getenv("NOTION_COMMENT_WORKERS", "3"))
+
+# Chat renderizado por página: revalida quando a página muda ou após o TTL
+cache_comentarios = CacheDisco(
+    "cache_comentarios_demandas.json",
+    ttl_segundos=int(os.getenv("NOTION_COMMENT_CACHE_TTL", str(24 * 3600))),
+    max_entradas=int(os.getenv("NOTION_COMMENT_CACHE_MAX", "20000")),
+)
 
 
 def get_user_name(user_id):
-    """Busca o nome do usuário pelo ID (com cache)"""
-    if user_id in user_cache:
-        return user_cache[user_id]
+    """Busca o nome do usuário pelo ID (diretório em disco; API só para IDs novos)"""
+    nome = diretorio_usuarios.nome_usuario(user_id)
+    if nome is not None:
+        return nome
     try:
         user = notion.users.retrieve(user_id)
         name = user.get("name", "Desconhecido")
-        user_cache[user_id] = name
+        diretorio_usuarios.registrar_usuario(user_id, name)
         return name
-    except:
+    except notion_gateway.ERROS_NOTION:
         return "Time"
 
 
+def _buscar_comentarios(page_id):
+    """Versão sem tratamento de erro (usada pelo cache, que não guarda falhas)."""
+    comments = notion.comments.list(block_id=page_id)
+    historico = []
+
+    for c in comments.get("results", []):
+        # Extrai texto
+        texto_parts = [t.get("plain_text", "") for t in c.get("rich_text", [])]
+        texto_completo = "".join(texto_parts)
+
+        # Extrai Autor
+        user_obj = c.get("created_by", {})
+        nome_autor = get_user_name(user_obj.get("id"))
+
+        # Extrai Data (Formato DD/MM)
+        raw_date = c.get("created_time")
+        data_fmt = ""
+        if raw_date:
+            dt = datetime.fromisoformat(raw_date.replace("Z", "+00:00"))
+            data_fmt = dt.strftime("%d/%m")
+
+        if texto_completo:
+            # Formata: (Data) [Autor]: Comentário
+            historico.append(f"({data_fmt}) [{nome_autor}]: {texto_completo}")
+
+    return "\n".join(historico)
+
+
 def buscar_comentarios_nativos(page_id):
     """
     Busca o histórico de comentários da página (chat)
     para criar a cronologia que a IA usa.
     """
     try:
-        comments = notion.comments.list(block_id=page_id)
-        historico = []
-
-        for c in comments.get("results", []):
-            # Extrai texto
-            texto_parts = [t.get("plain_text", "") for t in c.get("rich_text", [])]
-            texto_completo = "".join(texto_parts)
-
-            # Extrai Autor
-            user_obj = c.get("created_by", {})
-            nome_autor = get_user_name(user_obj.get("id"))
-
-            # Extrai Data (Formato DD/MM)
-            raw_date = c.get("created_time")
-            data_fmt = ""
-            if raw_date:
-                dt = datetime.fromisoformat(raw_date.replace("Z", "+00:00"))
-                data_fmt = dt.strftime("%d/%m")
-
-            if texto_completo:
-                # Formata: (Data) [Autor]: Comentário
-                historico.append(f"({data_fmt}) [{nome_autor}]: {texto_completo}")
-
-        return "\n".join(historico)
-    except:
+        return _buscar_comentarios(page_id)
+    except notion_gateway.ERROS_NOTION:
+        return ""
+
+
+def _buscar_e_guardar_comentarios(pagina):
+    page_id, editado_em = pagina
+    try:
+        chat = _buscar_comentarios(page_id)
+    except notion_gateway.ERROS_NOTION as e:
+        # Já passou pelas novas tentativas do gateway: segue sem o chat desta página
+        print(f"   Comentários de {page_id} indisponíveis: {e}")
         return ""
+    cache_comentarios.gravar(page_id, chat, versao=editado_em)
+    return chat
+
+
+def buscar_comentarios_em_lote(paginas):
+    """
+    Busca o chat de várias páginas (page_id, last_edited_time) na mesma ordem.
+    Usa o cache em disco; só as páginas editadas/expiradas vão à API, em paralelo.
+    """
+    chats = [cache_comentarios.obter(pid, versao=editado) for pid, editado in paginas]
+    faltantes = [i for i, chat in enumerate(chats) if chat is None]
+    if faltantes:
+        with ThreadPoolExecutor(max_workers=max(1, COMMENT_WORKERS)) as pool:
+            buscados = pool.map(_buscar_e_guardar_comentarios, [paginas[i] for i in faltantes])
+            for i, chat in zip(faltantes, buscados):
+                chats[i] = chat
+    return chats
 
 
 def safe_get(page, prop_name):
@@ -105,7 +162,7 @@ def safe_get(page, prop_name):
         elif tipo == "relation":
             # Retorna apenas o ID se for relação, pois não temos o nome sem outra query
             return "Relacionado"
-    except:
+    except (KeyError, IndexError, TypeError, AttributeError):
         return None
     return None
 
@@ -123,7 +180,7 @@ def atualizar_tarefa_notion(page_id, coluna, novo_valor):
                 rich_text=[{"text": {"content": str(novo_valor)}}],
             )
             return True, "Comentário adicionado"
-        except:
+        except notion_gateway.ERROS_NOTION:
             # Fallback: tenta salvar em coluna de texto se comentário falhar
             props["Observação"] = {
                 "rich_text": [{"text": {"content": str(novo_valor)}}]
@@ -141,7 +198,7 @@ def atualizar_tarefa_notion(page_id, coluna, novo_valor):
         try:
             notion.pages.update(page_id=page_id, properties=props)
             return True, "Atualizado com sucesso"
-        except Exception as e:
+        except notion_gateway.ERROS_NOTION as e:
             return False, f"Erro Notion: {str(e)}"
     return False, "Nenhuma alteração enviada"
 
@@ -151,26 +208,56 @@ def rodar_sincronizacao():
     Função Principal:
     1. Varre o banco de dados inteiro (lidando com paginação).
     2. Extrai e limpa os dados.
-    3. Salva em CSV para o app ler.
+    3. Salva no armazenamento local para o app ler.
     """
+    (ok, msg), juntou = controle_sync.executar_unico("demandas", _sincronizar)
+    if juntou:
+        msg += " (sync já estava em andamento)"
+    return ok, msg
+
+
+def _sincronizar():
     print(f"🔄 Iniciando sincronização com DB: {DB_ID_DEMANDAS}")
 
+    try:
+        diretorio_usuarios.carregar_usuarios(notion)
+    except notion_gateway.ERROS_NOTION as e:
+        print(f"   Diretório de usuários indisponível: {e}")
+
     lista_final = []
     has_more = True
     next_cursor = None
     page_count = 0
+    hits_antes, misses_antes = cache_comentarios.hits, cache_comentarios.misses
+
+    # Escopo (SYNC_ESCOPO) e projeção vão na própria consulta
+    filtro = escopo_sync.filtro(
+        notion,
+        DB_ID_DEMANDAS,
+        "Status",
+        lambda s: any(p in s.lower() for p in ("conclu", "done", "final")),
+        ["Data", "Prazo", "Timeline"],
+    )
+    projecao = escopo_sync.projecao(notion, DB_ID_DEMANDAS, PROPRIEDADES_DEMANDA)
 
     while has_more:
         try:
             # Faz a query no Notion
             query_params = {"database_id": DB_ID_DEMANDAS}
+            if filtro:
+                query_params["filter"] = filtro
+            if projecao:
+                query_params["filter_properties"] = projecao
             if next_cursor:
                 query_params["start_cursor"] = next_cursor
 
             response = notion.databases.query(**query_params)
             results = response.get("results", [])
 
-            for page in results:
+            chats = buscar_comentarios_em_lote(
+                [(p["id"], p.get("last_edited_time")) for p in results]
+            )
+            for page, chat_historico in zip(results, chats):
                 page_id = page["id"]
 
                 # --- MAPEAMENTO DE COLUNAS ---
@@ -218,7 +305,6 @@ def rodar_sincronizacao():
                 # Chat / Comentários
                 # Tenta pegar coluna de texto 'Observação' E junta com comentários nativos
                 obs_texto = safe_get(page, "Observação") or ""
-                chat_historico = buscar_comentarios_nativos(page_id)
 
                 obs_final = ""
                 if chat_historico:
@@ -259,13 +345,23 @@ def rodar_sincronizacao():
 
         except Exception as e:
             print(f"❌ Erro na sincronização: {e}")
+            cache_comentarios.salvar()
+            diretorio_usuarios.diretorio.salvar()
             return False, f"Erro: {e}"
 
-    # Salva no CSV
+    cache_comentarios.salvar()
+    diretorio_usuarios.diretorio.salvar()
+    hits = cache_comentarios.hits - hits_antes
+    misses = cache_comentarios.misses - misses_antes
+    print(f"   Cache de comentários: {hits} hits / {misses} misses")
+    print("   Chamadas ao Notion (processo):")
+    notion_gateway.metricas.imprimir()
+
+    # Salva no armazenamento (SQLite/CSV)
     if lista_final:
         df = pd.DataFrame(lista_final)
-        df.to_csv("tarefas_dbv.csv", index=False)
-        return True, f"Sucesso! {len(lista_final)} demandas sincronizadas."
+        armazenamento.obter_armazenamento().substituir(df)
+        return True, f"Sucesso! {len(lista_final)} demandas sincronizadas ({hits} chats do cache)."
     else:
         return False, "Nenhuma tarefa encontrada no Banco de Dados."
 
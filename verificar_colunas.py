@@ -1,7 +1,8 @@
-from notion_client import Client as NotionClient
 import json
 import os
 
+import notion_gateway
+
 # --- CONFIGURAÇÃO ---
 NOTION_TOKEN = os.getenv("NOTION_TOKEN")
 DB_ID_PROJETOS = os.getenv("NOTION_DB_ID_PROJETOS")
@@ -10,7 +11,7 @@ DB_ID_TAREFAS = os.getenv("NOTION_DB_ID_TAREFAS")
 if not NOTION_TOKEN or not DB_ID_PROJETOS or not DB_ID_TAREFAS:
     raise RuntimeError("Variáveis ausentes: NOTION_TOKEN / NOTION_DB_ID_PROJETOS / NOTION_DB_ID_TAREFAS")
 
-notion = NotionClient(auth=NOTION_TOKEN)
+notion = notion_gateway.obter_cliente(NOTION_TOKEN)
 
 
 def analisar_banco(db_id, nome_banco):
@@ -27,7 +28,7 @@ def analisar_banco(db_id, nome_banco):
             tipo = dados["type"]
             print(f"{nome_coluna:<30} | {tipo}")
 
-    except Exception as e:
+    except notion_gateway.ERROS_NOTION as e:
         print(f"❌ Erro ao acessar {nome_banco}: {e}")
 
 